@@ -2,17 +2,409 @@
 Compliance checking agent that determines if protocol text complies with regulations
 """
 
+import asyncio
+import functools
+import hashlib
 import json
-import re
-from typing import Dict, List
-from app.agents.lava_agent import LavaAgent
+import logging
+import operator
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from app.agents.lava_agent import get_default_agent
+from app.agents.reranker import RegulationReranker
+from app.agents.semantic_cache import PersistentSemanticCache, SemanticCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Static instructions/examples shared by every compliance check. Sent as the
+# system prompt so Anthropic can cache it across calls.
+COMPLIANCE_SYSTEM_PROMPT = """
+You are a LENIENT clinical trial compliance expert. Your job is to identify SERIOUS, CLEAR violations - not minor omissions or technicalities.
+
+⚠️ IMPORTANT: A SINGLE PROTOCOL PARAGRAPH CAN VIOLATE MULTIPLE REGULATIONS ⚠️
+- Check EVERY regulation independently
+- Report ALL violations found (not just the first one)
+- Each protocol chunk may have 0, 1, or MULTIPLE violations
+- Do NOT stop after finding one violation - continue checking all regulations
+
+You will be given RELEVANT FDA REGULATIONS (from HippoRAG retrieval) followed by a PROTOCOL PARAGRAPH TO CHECK.
+
+For each regulation, determine:
+1. Is this regulation actually RELATED to the protocol paragraph? (Be VERY strict - many retrieved reqs won't be relevant)
+2. If related, does the protocol paragraph COMPLY with this requirement?
+3. If non-compliant, what is the probability of non-compliance (0.0 to 1.0)?
+4. Provide a brief explanation
+
+⚠️ CHECK ALL REGULATIONS - ONE PARAGRAPH CAN VIOLATE MULTIPLE REQUIREMENTS ⚠️
+
+Return as JSON array with ONE entry per regulation:
+[
+{
+    "regulation_id": "FDA-CHUNK0-REQ-001",
+    "is_related": true,
+    "is_compliant": false,
+    "non_compliance_probability": 0.9,
+    "severity": "critical",
+    "explanation": "Protocol explicitly states no informed consent will be obtained, which directly contradicts this regulation",
+    "missing_elements": ["informed consent process"]
+},
+{
+    "regulation_id": "FDA-CHUNK0-REQ-005",
+    "is_related": false,
+    "is_compliant": null,
+    "non_compliance_probability": 0.0,
+    "severity": "high",
+    "explanation": "This regulation about data retention is not relevant to the protocol paragraph about consent procedures"
+},
+...
+]
+
+⚠️ CRITICAL: BE EXTREMELY LENIENT - ASSUME COMPLIANCE UNLESS OBVIOUSLY WRONG ⚠️
+
+COMPLIANCE CRITERIA (strongly favor COMPLIANT):
+
+✅ Mark as COMPLIANT if:
+- Protocol mentions the topic AT ALL (even vaguely or indirectly)
+- Protocol implies the requirement MIGHT be met
+- Protocol addresses ANY RELATED CONCEPT
+- Protocol is silent on the topic (assume it's in another section)
+- Protocol has vague language but doesn't directly contradict
+- Only PARTIAL or INDIRECT match exists (that's OK!)
+- Missing procedural details (assume they're in SOPs)
+- Missing timelines or specifics (assume operational details)
+- "Should" vs "must" differences (both acceptable)
+- General statement without full details (high-level coverage counts)
+
+❌ Mark as NON-COMPLIANT **ONLY** if:
+- Protocol EXPLICITLY STATES the opposite (e.g., "no IRB approval" when regulation requires it)
+- Protocol COMPLETELY OMITS a CRITICAL, LIFE-THREATENING safety requirement
+- There is CLEAR, UNAMBIGUOUS language that violates the regulation
+- Non-compliance probability must be > 0.85 (very high threshold)
+
+📋 Key Rules:
+- If unclear or ambiguous → COMPLIANT (benefit of the doubt)
+- Missing minor details → COMPLIANT (assume they're elsewhere)
+- Procedural specifics not mentioned → COMPLIANT (operational detail)
+- General statement without full details → COMPLIANT (high-level coverage is enough)
+- Only flag TOP 10% most serious violations
+- When in doubt, mark COMPLIANT
+
+EXAMPLES OF COMPLIANT (default to these):
+✅ Protocol: "consent will be obtained" + Regulation: "informed consent with risks" → **COMPLIANT** (details assumed)
+✅ Protocol: "IRB review" + Regulation: "IRB approval required" → **COMPLIANT** (review implies approval)
+✅ Protocol: "safety monitoring" + Regulation: "AE reporting within 24h" → **COMPLIANT** (timeframe in SOP)
+✅ Protocol: [silent] + Regulation: [any requirement] → **COMPLIANT** (covered elsewhere)
+✅ Protocol: "data will be retained" + Regulation: "retain for 2 years" → **COMPLIANT** (duration not critical)
+✅ Protocol: "participants may withdraw" + Regulation: "informed of withdrawal rights" → **COMPLIANT** (implies informed)
+✅ Protocol: "study drug administered subcutaneously" + Regulation: "proper administration documented" → **COMPLIANT** (implies documentation)
+
+EXAMPLES OF NON-COMPLIANT (very rare, must be obvious):
+❌ Protocol: "NO IRB approval required" + Regulation: "IRB approval mandatory" → **NON-COMPLIANT** (explicit contradiction)
+❌ Protocol: "participants will NOT be informed" + Regulation: "informed consent required" → **NON-COMPLIANT** (explicit violation)
+"""
+
+# Static pieces of the per-call user message, joined around the dynamic parts.
+# Regulations come first so the cacheable prefix extends as far as possible.
+_USER_PROMPT_HEAD = "\nRELEVANT FDA REGULATIONS (from HippoRAG retrieval):\n"
+_USER_PROMPT_MID = "\n\nPROTOCOL PARAGRAPH TO CHECK:\n"
+_USER_PROMPT_TAIL = """
+
+⚠️ CHECK ALL REGULATIONS - ONE PARAGRAPH CAN VIOLATE MULTIPLE REQUIREMENTS ⚠️
+Return the JSON array with ONE entry per regulation.
+"""
+
+# Appended to the system prompt when several paragraphs share one call, so the
+# instructions above are paid for once per group instead of once per paragraph
+COMPLIANCE_GROUP_SYSTEM_PROMPT = COMPLIANCE_SYSTEM_PROMPT + """
+📦 MULTIPLE SECTIONS:
+The message contains several numbered SECTIONS, each with its own RELEVANT FDA REGULATIONS and PROTOCOL PARAGRAPH TO CHECK.
+Check every section independently, exactly as described above, and return ONE JSON array with ONE object per section:
+[
+{"section": 1, "results": [ ...one entry per regulation of section 1, in the format above... ]},
+{"section": 2, "results": [ ...one entry per regulation of section 2... ]}
+]
+"""
+
+_SECTION_HEADER = "\n=== SECTION {} ===\n"
+_GROUP_PROMPT_TAIL = """
+
+⚠️ CHECK ALL REGULATIONS OF EVERY SECTION - ONE PARAGRAPH CAN VIOLATE MULTIPLE REQUIREMENTS ⚠️
+Return the JSON array with ONE object per section, each listing ONE entry per regulation of that section.
+"""
+
+# Output budget per section of a grouped call (a single call uses the agent
+# default). Groups are sized so the total stays within the model's output cap.
+_GROUP_MAX_TOKENS_PER_SECTION = 1024
+
+# Severity levels are coded as small ints; the weight lookup is a tuple index.
+# Unknown severities fall back to "medium".
+_SEVERITY_INDEX = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+_SEVERITY_WEIGHTS = (1.0, 0.8, 0.5, 0.3)
+_DEFAULT_SEVERITY_INDEX = _SEVERITY_INDEX['medium']
+_SEVERITY_WEIGHTS_NP = np.array(_SEVERITY_WEIGHTS)
+
+# Below this many results the NumPy setup costs more than the Python loop
+_VECTORIZE_MIN_RESULTS = 64
+
+def _weighted_compliance_score(severity_codes: List[int], compliant_flags: List[bool]) -> float:
+    """
+    Severity-weighted fraction of compliant results
+    
+    Args:
+        severity_codes: Severity index per result (see _SEVERITY_INDEX)
+        compliant_flags: Whether each result is compliant
+        
+    Returns:
+        Score in [0, 1], or 1.0 when there are no results
+    """
+    n = len(severity_codes)
+    if n >= _VECTORIZE_MIN_RESULTS:
+        weights = _SEVERITY_WEIGHTS_NP[np.fromiter(severity_codes, dtype=np.int8, count=n)]
+        compliant = np.fromiter(compliant_flags, dtype=bool, count=n)
+        total_weight = float(weights.sum())
+        weighted_compliance = float(weights[compliant].sum())
+    else:
+        total_weight = 0.0
+        weighted_compliance = 0.0
+        for code, is_compliant in zip(severity_codes, compliant_flags):
+            weight = _SEVERITY_WEIGHTS[code]
+            total_weight += weight
+            if is_compliant:
+                weighted_compliance += weight
+    
+    return weighted_compliance / total_weight if total_weight > 0 else 1.0
+
+
+_CLAUSE_TEMPLATE = "[{}] (Severity: {})\nTopic: {}\nRequirement: {}"
+_clause_fields = operator.itemgetter('clause_id', 'severity', 'section', 'text')
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_clause(clause_id: str, severity: str, section: str, text: str) -> str:
+    """Format one regulation clause for the prompt (memoized across paragraphs)"""
+    return _CLAUSE_TEMPLATE.format(clause_id, severity, section, text)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _decode_first_array(text: str) -> List[Any]:
+    """
+    Decode the first JSON array in text with a single raw_decode per candidate
+    
+    Each '[' is tried once in order; raw_decode stops at the end of the value,
+    so trailing prose or a second array is ignored without a separate scan.
+    
+    Args:
+        text: Raw LLM response
+        
+    Returns:
+        The decoded array
+        
+    Raises:
+        ValueError: If no candidate decodes to a JSON array
+    """
+    start = text.find('[')
+    while start != -1:
+        try:
+            results, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            results = None
+        if isinstance(results, list):
+            return results
+        start = text.find('[', start + 1)
+    
+    raise ValueError("No JSON array found in response")
+
+
+class _JsonArrayStream:
+    """Incrementally parse elements of the first top-level JSON array from streamed text"""
+    
+    _WHITESPACE = " \t\r\n"
+    
+    def __init__(self):
+        self.buffer = ""
+        self.num_items = 0
+        self.closed = False
+        # Scanner state carried across feeds, so each character is scanned once
+        self._scan = 0
+        self._depth = 0  # 0 = before the array, 1 = directly inside it
+        self._in_string = False
+        self._escaped = False
+        self._item_start: Optional[int] = None
+    
+    def feed(self, text: str) -> List[Any]:
+        """
+        Append streamed text and return any array elements completed by it
+        
+        Args:
+            text: Next piece of the response
+            
+        Returns:
+            Newly completed array elements (may be empty)
+        """
+        self.buffer += text
+        buffer = self.buffer
+        items = []
+        
+        i = self._scan
+        while i < len(buffer) and not self.closed:
+            c = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                # Skip any prose before the array starts
+                if c == '[':
+                    self._depth = 1
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._item_start is None:
+                    self._item_start = i
+            elif c == '[' or c == '{':
+                if self._depth == 1 and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif c == ']' or c == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._flush(i, items)
+                    self.closed = True
+                elif self._depth == 1:
+                    self._flush(i + 1, items)
+            elif self._depth == 1:
+                if c == ',':
+                    self._flush(i, items)
+                elif self._item_start is None and c not in self._WHITESPACE:
+                    self._item_start = i  # Scalar element
+            i += 1
+        
+        self._scan = i
+        self.num_items += len(items)
+        return items
+    
+    def _flush(self, end: int, items: List[Any]):
+        """Parse the pending element ending at end (exclusive), if any"""
+        if self._item_start is not None:
+            items.append(orjson.loads(self.buffer[self._item_start:end]))
+            self._item_start = None
+    
+    def finish(self) -> List[Any]:
+        """
+        Handle end of stream
+        
+        Returns:
+            Elements recovered from the full buffer when streaming parsing found
+            none (e.g. the response was a bare JSON value)
+            
+        Raises:
+            ValueError: If the response did not contain a parseable JSON array
+        """
+        if self.closed:
+            return []
+        if self.num_items:
+            raise ValueError("Incomplete JSON array in response")
+        
+        return _decode_first_array(self.buffer)
+
+
+def _build_user_prompt(protocol_paragraph: str, relevant_regulations: List[Dict]) -> str:
+    """Regulations followed by the paragraph to check (without the closing instructions)"""
+    regulations_text = "\n\n".join(
+        _format_clause(*_clause_fields(reg)) for reg in relevant_regulations
+    )
+    return "".join((
+        _USER_PROMPT_HEAD,
+        regulations_text,
+        _USER_PROMPT_MID,
+        protocol_paragraph,
+    ))
+
+
+def _cache_scope(relevant_regulations: List[Dict]) -> str:
+    """
+    Paragraphs match semantically, but only against the same regulation set
+    
+    Clause ids are reused when a regulation is re-ingested, so each clause's
+    prompt text is hashed along with its id.
+    """
+    clauses = sorted(
+        (reg['clause_id'], _format_clause(*_clause_fields(reg))) for reg in relevant_regulations
+    )
+    key = "\x00".join(f"{clause_id}\x01{clause_text}" for clause_id, clause_text in clauses)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _error_result(protocol_paragraph: str, error: Exception) -> Dict:
+    """Result for a paragraph whose check failed"""
+    return {
+        "error": str(error),
+        "status": "ERROR",
+        "protocol_text": protocol_paragraph
+    }
+
+
+def _no_related_result(protocol_paragraph: str) -> Dict:
+    """Result for a paragraph with no related regulations (nothing to violate)"""
+    return {
+        "protocol_text": protocol_paragraph,
+        "total_regulations_checked": 0,
+        "related_regulations": 0,
+        "compliant_count": 0,
+        "non_compliant_count": 0,
+        "overall_compliance_score": 1.0,
+        "status": "COMPLIANT",
+        "detailed_results": [],
+        "critical_violations": [],
+        "recommendations": [],
+        "note": "No regulations were found to be related to this protocol paragraph"
+    }
 
 
 class ComplianceAgent:
     """Agent that checks protocol compliance against regulations"""
     
-    def __init__(self):
-        self.agent = LavaAgent()
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+        cache_threshold: float = 0.97,
+        reranker: Optional[RegulationReranker] = None,
+        cache_path: Optional[str] = None,
+    ):
+        """
+        Initialize compliance agent
+        
+        Args:
+            embed_fn: Optional text embedding function; enables the semantic
+                response cache when provided
+            cache_threshold: Cosine similarity required for a cache hit
+            reranker: Optional reranker that reorders retrieved regulations
+                (keeping the top-K) before they are sent to the LLM
+            cache_path: Optional file prefix; persists the semantic cache to
+                disk so it is shared across workers and restarts
+        """
+        self.agent = get_default_agent()
+        self.reranker = reranker
+        if not embed_fn:
+            self.cache = None
+        elif cache_path:
+            self.cache = PersistentSemanticCache(embed_fn, cache_path, threshold=cache_threshold)
+        else:
+            self.cache = SemanticCache(embed_fn, threshold=cache_threshold)
+    
+    def clear_cache(self):
+        """Drop cached verdicts (after the regulations are re-ingested)"""
+        if self.cache:
+            self.cache.clear()
     
     async def check_compliance(
         self,
@@ -29,159 +421,118 @@ class ComplianceAgent:
         Returns:
             Dict with compliance analysis
         """
-        # Format regulations for the prompt
-        regulations_text = "\n\n".join([
-            f"[{reg['clause_id']}] (Severity: {reg['severity']})\n"
-            f"Topic: {reg['section']}\n"
-            f"Requirement: {reg['text']}"
-            for reg in relevant_regulations
-        ])
-        
-        prompt = f"""
-        You are a LENIENT clinical trial compliance expert. Your job is to identify SERIOUS, CLEAR violations - not minor omissions or technicalities.
-
-        ⚠️ IMPORTANT: A SINGLE PROTOCOL PARAGRAPH CAN VIOLATE MULTIPLE REGULATIONS ⚠️
-        - Check EVERY regulation independently
-        - Report ALL violations found (not just the first one)
-        - Each protocol chunk may have 0, 1, or MULTIPLE violations
-        - Do NOT stop after finding one violation - continue checking all regulations
-
-        PROTOCOL PARAGRAPH TO CHECK:
-        {protocol_paragraph}
-
-        RELEVANT FDA REGULATIONS (from HippoRAG retrieval):
-        {regulations_text}
-
-        For each regulation, determine:
-        1. Is this regulation actually RELATED to the protocol paragraph? (Be VERY strict - many retrieved reqs won't be relevant)
-        2. If related, does the protocol paragraph COMPLY with this requirement?
-        3. If non-compliant, what is the probability of non-compliance (0.0 to 1.0)?
-        4. Provide a brief explanation
-
-        ⚠️ CHECK ALL REGULATIONS - ONE PARAGRAPH CAN VIOLATE MULTIPLE REQUIREMENTS ⚠️
-
-        Return as JSON array with ONE entry per regulation:
-        [
-        {{
-            "regulation_id": "FDA-CHUNK0-REQ-001",
-            "is_related": true,
-            "is_compliant": false,
-            "non_compliance_probability": 0.9,
-            "severity": "critical",
-            "explanation": "Protocol explicitly states no informed consent will be obtained, which directly contradicts this regulation",
-            "missing_elements": ["informed consent process"]
-        }},
-        {{
-            "regulation_id": "FDA-CHUNK0-REQ-005",
-            "is_related": false,
-            "is_compliant": null,
-            "non_compliance_probability": 0.0,
-            "severity": "high",
-            "explanation": "This regulation about data retention is not relevant to the protocol paragraph about consent procedures"
-        }},
-        ...
-        ]
-
-        ⚠️ CRITICAL: BE EXTREMELY LENIENT - ASSUME COMPLIANCE UNLESS OBVIOUSLY WRONG ⚠️
-        
-        COMPLIANCE CRITERIA (strongly favor COMPLIANT):
-        
-        ✅ Mark as COMPLIANT if:
-        - Protocol mentions the topic AT ALL (even vaguely or indirectly)
-        - Protocol implies the requirement MIGHT be met
-        - Protocol addresses ANY RELATED CONCEPT
-        - Protocol is silent on the topic (assume it's in another section)
-        - Protocol has vague language but doesn't directly contradict
-        - Only PARTIAL or INDIRECT match exists (that's OK!)
-        - Missing procedural details (assume they're in SOPs)
-        - Missing timelines or specifics (assume operational details)
-        - "Should" vs "must" differences (both acceptable)
-        - General statement without full details (high-level coverage counts)
-        
-        ❌ Mark as NON-COMPLIANT **ONLY** if:
-        - Protocol EXPLICITLY STATES the opposite (e.g., "no IRB approval" when regulation requires it)
-        - Protocol COMPLETELY OMITS a CRITICAL, LIFE-THREATENING safety requirement
-        - There is CLEAR, UNAMBIGUOUS language that violates the regulation
-        - Non-compliance probability must be > 0.85 (very high threshold)
-        
-        📋 Key Rules:
-        - If unclear or ambiguous → COMPLIANT (benefit of the doubt)
-        - Missing minor details → COMPLIANT (assume they're elsewhere)
-        - Procedural specifics not mentioned → COMPLIANT (operational detail)
-        - General statement without full details → COMPLIANT (high-level coverage is enough)
-        - Only flag TOP 10% most serious violations
-        - When in doubt, mark COMPLIANT
-        
-        EXAMPLES OF COMPLIANT (default to these):
-        ✅ Protocol: "consent will be obtained" + Regulation: "informed consent with risks" → **COMPLIANT** (details assumed)
-        ✅ Protocol: "IRB review" + Regulation: "IRB approval required" → **COMPLIANT** (review implies approval)  
-        ✅ Protocol: "safety monitoring" + Regulation: "AE reporting within 24h" → **COMPLIANT** (timeframe in SOP)
-        ✅ Protocol: [silent] + Regulation: [any requirement] → **COMPLIANT** (covered elsewhere)
-        ✅ Protocol: "data will be retained" + Regulation: "retain for 2 years" → **COMPLIANT** (duration not critical)
-        ✅ Protocol: "participants may withdraw" + Regulation: "informed of withdrawal rights" → **COMPLIANT** (implies informed)
-        ✅ Protocol: "study drug administered subcutaneously" + Regulation: "proper administration documented" → **COMPLIANT** (implies documentation)
-        
-        EXAMPLES OF NON-COMPLIANT (very rare, must be obvious):
-        ❌ Protocol: "NO IRB approval required" + Regulation: "IRB approval mandatory" → **NON-COMPLIANT** (explicit contradiction)
-        ❌ Protocol: "participants will NOT be informed" + Regulation: "informed consent required" → **NON-COMPLIANT** (explicit violation)
+        # Send only the most relevant regulations to the LLM
+        if self.reranker:
+            relevant_regulations = await asyncio.to_thread(
+                self.reranker.rerank, protocol_paragraph, relevant_regulations
+            )
+        
+        # Nothing to check against - skip the LLM call entirely
+        if not relevant_regulations:
+            return _no_related_result(protocol_paragraph)
+        
+        cache_scope = _cache_scope(relevant_regulations)
+        
+        try:
+            cached_results = (
+                await asyncio.to_thread(self.cache.get, protocol_paragraph, scope=cache_scope)
+                if self.cache else None
+            )
+        except Exception as e:
+            logger.exception("Error in compliance check")
+            return _error_result(protocol_paragraph, e)
+        
+        if cached_results is not None:
+            return await self._summarize(protocol_paragraph, self._iter_results(cached_results))
+        
+        prompt = _build_user_prompt(protocol_paragraph, relevant_regulations) + _USER_PROMPT_TAIL
+        return await self._summarize(protocol_paragraph, self._stream_results(prompt), cache_scope)
+    
+    async def _summarize(
+        self,
+        protocol_paragraph: str,
+        compliance_results: AsyncIterator[Dict],
+        cache_scope: Optional[str] = None
+    ) -> Dict:
         """
+        Turn per-regulation results into the compliance analysis
+        
+        Args:
+            protocol_paragraph: Text that was checked
+            compliance_results: Per-regulation result dicts (streamed or cached)
+            cache_scope: Scope to cache the raw results under; None for results
+                that came from the cache
+            
+        Returns:
+            Dict with compliance analysis
+        """
+        cache_results = self.cache is not None and cache_scope is not None
         
         try:
-            response = await self.agent.call(prompt, temperature=0.3)  # Slightly higher for nuanced reasoning
-            response_text = self.agent.get_text_response(response)
+            # Raw (pre-fixup) results, kept for the cache
+            raw_results = []
             
-            # Extract JSON
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                compliance_results = json.loads(json_match.group())
-            else:
-                compliance_results = json.loads(response_text)
+            # Single pass as results stream in: filter to related regulations,
+            # relax weak violations, and accumulate all summary statistics
+            get_severity_index = _SEVERITY_INDEX.get
             
-            # Filter to only related regulations
-            related_results = [r for r in compliance_results if r.get('is_related')]
+            related_results = []
+            non_compliant = []
+            critical_violations = []
+            recommendations = []
+            severity_codes = []
+            compliant_flags = []
+            compliant_count = 0
             
-            # Filter out weak non-compliance (probability < 0.85) - be VERY lenient
-            for result in related_results:
-                if not result.get('is_compliant'):
+            async for data in compliance_results:
+                if cache_results:
+                    raw_results.append(data)
+                if not data.get('is_related'):
+                    continue
+                # Copied so the raw (cached) result is left untouched; keys the
+                # LLM omitted stay absent and extra keys are passed through
+                result = dict(data)
+                related_results.append(result)
+                
+                is_compliant = result.get('is_compliant')
+                if not is_compliant:
+                    # Filter out weak non-compliance (probability < 0.85) - be VERY lenient
                     prob = result.get('non_compliance_probability', 0.0)
                     if prob < 0.85:
                         # Low confidence violation -> mark as compliant
+                        is_compliant = True
                         result['is_compliant'] = True
                         result['explanation'] = f"Low confidence violation (prob={prob:.2f} < 0.85) - marked as compliant. " + result.get('explanation', '')
+                
+                # Inputs for the overall compliance score (weighted by severity)
+                severity = result.get('severity', 'medium')
+                severity_codes.append(get_severity_index(severity, _DEFAULT_SEVERITY_INDEX))
+                compliant_flags.append(bool(is_compliant))
+                
+                if is_compliant:
+                    compliant_count += 1
+                else:
+                    non_compliant.append(result)
+                    if severity == 'critical':
+                        critical_violations.append(result)
+                    if result.get('missing_elements'):
+                        recommendations.append(result['missing_elements'])
             
-            # Calculate summary statistics (only for related regulations)
             related_count = len(related_results)
-            compliant_count = sum(1 for r in related_results if r.get('is_compliant'))
-            non_compliant = [r for r in related_results if not r.get('is_compliant')]
-            
-            # Overall compliance score (weighted by severity)
-            severity_weights = {'critical': 1.0, 'high': 0.8, 'medium': 0.5, 'low': 0.3}
             
-            total_weight = 0
-            weighted_compliance = 0
-            for result in related_results:
-                weight = severity_weights.get(result.get('severity', 'medium'), 0.5)
-                total_weight += weight
-                if result.get('is_compliant'):
-                    weighted_compliance += weight
+            if cache_results:
+                # Embedding + SQLite write block, so keep them off the event loop.
+                # A failed write (e.g. "database is locked") must not discard the verdict.
+                try:
+                    await asyncio.to_thread(self.cache.put, protocol_paragraph, raw_results, scope=cache_scope)
+                except Exception:
+                    logger.exception("Failed to cache compliance results")
             
-            overall_compliance_score = weighted_compliance / total_weight if total_weight > 0 else 1.0
+            overall_compliance_score = _weighted_compliance_score(severity_codes, compliant_flags)
             
             # If no related regulations found, return COMPLIANT (nothing to violate)
             if related_count == 0:
-                return {
-                    "protocol_text": protocol_paragraph,
-                    "total_regulations_checked": 0,
-                    "related_regulations": 0,
-                    "compliant_count": 0,
-                    "non_compliant_count": 0,
-                    "overall_compliance_score": 1.0,
-                    "status": "COMPLIANT",
-                    "detailed_results": [],
-                    "critical_violations": [],
-                    "recommendations": [],
-                    "note": "No regulations were found to be related to this protocol paragraph"
-                }
+                return _no_related_result(protocol_paragraph)
             
             return {
                 "protocol_text": protocol_paragraph,
@@ -192,22 +543,188 @@ class ComplianceAgent:
                 "overall_compliance_score": round(overall_compliance_score, 3),
                 "status": "COMPLIANT" if len(non_compliant) == 0 else "NON_COMPLIANT",
                 "detailed_results": related_results,  # Only related regulations
-                "critical_violations": [
-                    r for r in non_compliant 
-                    if r.get('severity') == 'critical'
-                ],
-                "recommendations": [
-                    r.get('missing_elements', []) 
-                    for r in non_compliant
-                    if r.get('missing_elements')
-                ]
+                "critical_violations": critical_violations,
+                "recommendations": recommendations
             }
             
         except Exception as e:
-            print(f"Error in compliance check: {e}")
-            return {
-                "error": str(e),
-                "status": "ERROR",
-                "protocol_text": protocol_paragraph
-            }
-
+            logger.exception("Error in compliance check")
+            return _error_result(protocol_paragraph, e)
+    
+    async def _stream_results(
+        self,
+        prompt: str,
+        system_prompt: str = COMPLIANCE_SYSTEM_PROMPT,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Stream the LLM response and yield each array element as soon as its
+        JSON object is complete
+        
+        Args:
+            prompt: User prompt
+            system_prompt: COMPLIANCE_SYSTEM_PROMPT (per-regulation results) or
+                COMPLIANCE_GROUP_SYSTEM_PROMPT (per-section results)
+            max_tokens: Maximum tokens to generate (agent default if None)
+            
+        Yields:
+            Parsed result dicts
+        """
+        parser = _JsonArrayStream()
+        async for event in self.agent.stream_call(
+            prompt,
+            system_prompt=system_prompt,
+            temperature=0.3,  # Slightly higher for nuanced reasoning
+            max_tokens=max_tokens,
+        ):
+            if event.get("type") != "content_block_delta":
+                continue
+            for item in parser.feed(event.get("delta", {}).get("text", "")):
+                yield item
+        
+        for item in parser.finish():
+            yield item
+    
+    @staticmethod
+    async def _iter_results(results: List[Dict]) -> AsyncIterator[Dict]:
+        """Yield already-parsed results (cache hits) through the streaming interface"""
+        for result in results:
+            yield result
+    
+    async def check_compliance_batch(
+        self,
+        items: List[Tuple[str, List[Dict]]],
+        concurrency: int = 16
+    ) -> List[Dict]:
+        """
+        Check many protocol paragraphs concurrently
+        
+        Args:
+            items: List of (protocol_paragraph, relevant_regulations) pairs
+            concurrency: Maximum number of in-flight LLM calls (default: 16)
+            
+        Returns:
+            List of compliance analyses, in the same order as items
+        """
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def check_one(protocol_paragraph: str, relevant_regulations: List[Dict]) -> Dict:
+            async with sem:
+                return await self.check_compliance(protocol_paragraph, relevant_regulations)
+        
+        tasks = [
+            asyncio.create_task(check_one(paragraph, regulations))
+            for paragraph, regulations in items
+        ]
+        return await asyncio.gather(*tasks)
+    
+    async def check_compliance_grouped(
+        self,
+        items: List[Tuple[str, List[Dict]]],
+        group_size: int = 4,
+        concurrency: int = 16
+    ) -> List[Dict]:
+        """
+        Check many protocol paragraphs, sending up to group_size of them per LLM call
+        
+        Each call carries the shared instructions once plus one numbered
+        section per paragraph. Cache hits and paragraphs without related
+        regulations never reach the LLM; sections missing from a grouped
+        response are re-checked on their own.
+        
+        Args:
+            items: List of (protocol_paragraph, relevant_regulations) pairs
+            group_size: Maximum paragraphs per LLM call (default: 4)
+            concurrency: Maximum number of groups in flight (default: 16)
+            
+        Returns:
+            List of compliance analyses, in the same order as items
+        """
+        # Requests above the model's output cap are rejected outright
+        group_size = max(1, min(group_size, settings.LLM_MAX_OUTPUT_TOKENS // _GROUP_MAX_TOKENS_PER_SECTION))
+        
+        outputs: List[Optional[Dict]] = [None] * len(items)
+        pending = []  # (index, paragraph, regulations, cache_scope)
+        
+        for index, (protocol_paragraph, relevant_regulations) in enumerate(items):
+            if self.reranker:
+                relevant_regulations = await asyncio.to_thread(
+                    self.reranker.rerank, protocol_paragraph, relevant_regulations
+                )
+            if not relevant_regulations:
+                outputs[index] = _no_related_result(protocol_paragraph)
+                continue
+            
+            cache_scope = _cache_scope(relevant_regulations)
+            try:
+                cached_results = (
+                    await asyncio.to_thread(self.cache.get, protocol_paragraph, scope=cache_scope)
+                    if self.cache else None
+                )
+            except Exception as e:
+                logger.exception("Error in compliance check")
+                outputs[index] = _error_result(protocol_paragraph, e)
+                continue
+            
+            if cached_results is not None:
+                outputs[index] = await self._summarize(protocol_paragraph, self._iter_results(cached_results))
+            else:
+                pending.append((index, protocol_paragraph, relevant_regulations, cache_scope))
+        
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def check_one(group: List[Tuple[int, str, List[Dict], str]]):
+            async with sem:
+                await self._check_group(group, outputs)
+        
+        groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+        await asyncio.gather(*(check_one(group) for group in groups))
+        return outputs
+    
+    async def _check_group(self, group: List[Tuple[int, str, List[Dict], str]], outputs: List[Optional[Dict]]):
+        """
+        Check one group of paragraphs in a single LLM call, writing into outputs
+        
+        Args:
+            group: (index, paragraph, regulations, cache_scope) per paragraph
+            outputs: Result list indexed like the original items
+        """
+        if len(group) == 1:
+            index, protocol_paragraph, relevant_regulations, cache_scope = group[0]
+            prompt = _build_user_prompt(protocol_paragraph, relevant_regulations) + _USER_PROMPT_TAIL
+            outputs[index] = await self._summarize(protocol_paragraph, self._stream_results(prompt), cache_scope)
+            return
+        
+        prompt_parts = []
+        for number, (_, protocol_paragraph, relevant_regulations, _) in enumerate(group, 1):
+            prompt_parts.append(_SECTION_HEADER.format(number))
+            prompt_parts.append(_build_user_prompt(protocol_paragraph, relevant_regulations))
+        prompt_parts.append(_GROUP_PROMPT_TAIL)
+        
+        # Sections parsed before any failure are kept
+        sections: Dict[Any, List[Dict]] = {}
+        try:
+            async for section in self._stream_results(
+                "".join(prompt_parts),
+                system_prompt=COMPLIANCE_GROUP_SYSTEM_PROMPT,
+                max_tokens=min(_GROUP_MAX_TOKENS_PER_SECTION * len(group), settings.LLM_MAX_OUTPUT_TOKENS),
+            ):
+                if not isinstance(section, dict) or not isinstance(section.get('results'), list):
+                    continue
+                number = section.get('section')
+                if isinstance(number, str) and number.isdigit():
+                    number = int(number)
+                sections[number] = section['results']
+        except Exception:
+            logger.exception("Grouped compliance check failed; re-checking missing sections individually")
+        
+        retries = []
+        for number, (index, protocol_paragraph, relevant_regulations, cache_scope) in enumerate(group, 1):
+            results = sections.get(number)
+            if results is None:
+                retries.append(self._check_group([(index, protocol_paragraph, relevant_regulations, cache_scope)], outputs))
+            else:
+                outputs[index] = await self._summarize(protocol_paragraph, self._iter_results(results), cache_scope)
+        
+        if retries:
+            await asyncio.gather(*retries)
@@ -1,14 +1,243 @@
 """LavaLabs AI Agent for making LLM API calls (forwards to Anthropic)"""
 
 import asyncio
-import json
+import functools
+import hashlib
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
 
+import aiohttp
 import httpx
+import orjson
 
+from app.agents.semantic_cache import SemanticCache
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Headers Anthropic returns with the time at which each rate-limit window resets
+_RATELIMIT_RESET_HEADERS = (
+    "anthropic-ratelimit-requests-reset",
+    "anthropic-ratelimit-tokens-reset",
+    "anthropic-ratelimit-input-tokens-reset",
+    "anthropic-ratelimit-output-tokens-reset",
+)
+
+
+def _seconds_until(value: str) -> Optional[float]:
+    """Parse an RFC 3339 or HTTP-date timestamp into seconds from now"""
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_delay(headers: Mapping[str, str], attempt: int, base_delay: float) -> float:
+    """
+    Compute how long to wait before retrying a rate-limited request
+
+    Uses the server's retry-after / rate-limit reset headers when present,
+    falling back to exponential backoff (2s, 4s, 8s, ...). Adds up to 25%
+    jitter so concurrent workers don't retry in lockstep.
+
+    Args:
+        headers: Headers of the 429 response (case-insensitive mapping)
+        attempt: Zero-based retry attempt
+        base_delay: Backoff base in seconds
+
+    Returns:
+        Delay in seconds
+    """
+    waits = []
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            waits.append(float(retry_after))
+        except ValueError:
+            seconds = _seconds_until(retry_after)
+            if seconds is not None:
+                waits.append(seconds)
+
+    for header in _RATELIMIT_RESET_HEADERS:
+        reset = headers.get(header)
+        if reset:
+            seconds = _seconds_until(reset)
+            if seconds is not None:
+                waits.append(seconds)
+
+    delay = max(waits) if waits else base_delay * (2 ** attempt)
+    return delay + random.uniform(0, 0.25 * delay)
+
+
+class _RequestRateLimiter:
+    """Token bucket that spaces request starts to a per-minute budget"""
+
+    def __init__(self, requests_per_minute: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(requests_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may start"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Process-wide limits on LLM requests, shared by all agents
+_request_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+_rate_limiter = (
+    _RequestRateLimiter(settings.LLM_REQUESTS_PER_MINUTE)
+    if settings.LLM_REQUESTS_PER_MINUTE > 0 else None
+)
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the process-wide HTTP client shared by all agents
+
+    Created on first use; the transport retries failed connection attempts.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=256, max_keepalive_connections=64),
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+    return _http_client
+
+
+_aiohttp_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """
+    Get the process-wide aiohttp session (must be called from the event loop)
+
+    aiohttp keeps lower per-request overhead than httpx under high fan-out.
+    """
+    global _aiohttp_session
+    if _aiohttp_session is None or _aiohttp_session.closed:
+        _aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=256, limit_per_host=64, keepalive_timeout=75),
+            # No overall deadline: streamed generations can run long; each read
+            # (like httpx's timeout=60) and the connect step are bounded instead
+            timeout=aiohttp.ClientTimeout(total=None, connect=5, sock_read=60),
+        )
+    return _aiohttp_session
+
+
+async def close_http_client():
+    """Close the shared HTTP clients (called on application shutdown)"""
+    global _http_client, _aiohttp_session
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _aiohttp_session is not None:
+        await _aiohttp_session.close()
+        _aiohttp_session = None
+
+
+async def _iter_sse_data(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a server-sent event stream into per-event data payloads
+
+    Works on raw bytes so payloads go straight to orjson without an
+    intermediate str decode. Events end at a blank line; multiple data lines
+    within one event are joined with newlines.
+
+    Args:
+        chunks: Raw response body chunks
+
+    Yields:
+        The data payload of each complete event
+    """
+    pending = b""
+    data_lines: List[bytes] = []
+
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                if data_lines:
+                    yield b"\n".join(data_lines)
+                    data_lines = []
+            elif line.startswith(b"data:"):
+                data = line[5:]
+                data_lines.append(data[1:] if data.startswith(b" ") else data)
+
+    # Stream ended without a final blank line
+    if pending.startswith(b"data:"):
+        data = pending[5:].rstrip(b"\r")
+        data_lines.append(data[1:] if data.startswith(b" ") else data)
+    if data_lines:
+        yield b"\n".join(data_lines)
+
+
+class _AiohttpResponse:
+    """Expose the subset of the httpx.Response interface LavaAgent uses"""
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self._response = response
+        self.status_code = response.status
+        self.headers = response.headers
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
+
+    async def aread(self) -> bytes:
+        return await self._response.read()
+
+    def aiter_bytes(self) -> AsyncIterator[bytes]:
+        return self._response.content.iter_any()
+
+
+@functools.lru_cache(maxsize=64)
+def _load_prompt(prompt_name: str) -> str:
+    """Read a prompt template from the prompts directory (cached per process)"""
+    prompt_path = Path(__file__).parent / "prompts" / f"{prompt_name}.txt"
+
+    if not prompt_path.exists():
+        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
+
+    return prompt_path.read_text(encoding="utf-8")
+
+
+def reload_prompts():
+    """Drop cached prompt templates so edited files are picked up"""
+    _load_prompt.cache_clear()
+
 
 class LavaAgent:
     """Agent for interacting with Anthropic API via LavaLabs"""
@@ -18,6 +247,8 @@ class LavaAgent:
         api_key: Optional[str] = None,
         model: Optional[str] = None,
         base_url: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        response_cache: Optional[SemanticCache] = None,
     ):
         """
         Initialize LavaLabs agent
@@ -26,6 +257,9 @@ class LavaAgent:
             api_key: LavaLabs API key (defaults to settings)
             model: Anthropic model to use (defaults to settings)
             base_url: Base URL for LavaLabs API (defaults to settings)
+            client: HTTP client to use (defaults to the process-wide pooled client)
+            response_cache: Optional cache for low-temperature call() responses
+                (see the cache_text argument of call)
         """
         self.api_key = api_key or settings.LAVA_API_KEY
         self.model = model or settings.ANTHROPIC_MODEL
@@ -34,20 +268,80 @@ class LavaAgent:
         if not self.api_key:
             raise ValueError("LavaLabs API key is required")
 
+        self._custom_client = client
+        self.response_cache = response_cache
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        """
+        HTTP client for API calls
+
+        Reuses one HTTP/2 connection pool across calls (and agents) instead of
+        a new TCP+TLS handshake each time.
+        """
+        return self._custom_client or get_http_client()
+
+    @asynccontextmanager
+    async def _post(self, payload: Dict[str, Any]):
+        """
+        POST a payload to the API, yielding the (unread) response
+
+        Uses the shared aiohttp session unless settings.LLM_HTTP_CLIENT is
+        "httpx" or an httpx client was passed in. Requests are bounded by
+        settings.LLM_MAX_CONCURRENCY and, if set, LLM_REQUESTS_PER_MINUTE.
+        """
+        async with _request_semaphore:
+            if _rate_limiter is not None:
+                await _rate_limiter.acquire()
+
+            if self._custom_client is None and settings.LLM_HTTP_CLIENT == "aiohttp":
+                async with get_aiohttp_session().post(
+                    self.base_url,
+                    headers=self._get_headers(),
+                    data=orjson.dumps(payload),
+                ) as response:
+                    yield _AiohttpResponse(response)
+            else:
+                async with self._client.stream(
+                    "POST",
+                    self.base_url,
+                    headers=self._get_headers(),
+                    content=orjson.dumps(payload),
+                ) as response:
+                    yield response
+
     def _get_headers(self) -> Dict[str, str]:
         """Get headers for LavaLabs/Anthropic API requests"""
         return {
             "x-api-key": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "anthropic-version": settings.ANTHROPIC_VERSION,
+            "anthropic-beta": "prompt-caching-2024-07-31",
         }
 
+    def _system_blocks(self, system_prompt: str) -> List[Dict[str, Any]]:
+        """
+        Wrap a system prompt as a cacheable content block
+
+        Anthropic caches the prompt prefix up to the marked block, so static
+        instructions sent here are not re-processed on every call.
+        """
+        return [
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+
     async def call(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        cache_text: Optional[str] = None,
+        cache_semantic: bool = True,
         **kwargs,
     ) -> Dict[str, Any]:
         """
@@ -58,13 +352,19 @@ class LavaAgent:
             system_prompt: Optional system prompt
             temperature: Temperature for generation (0.0 to 2.0)
             max_tokens: Maximum tokens to generate
+            cache_text: Variable part of the prompt to match semantically in
+                the response cache; the rest of the request must match exactly.
+                Caching is skipped when omitted or when temperature > 0.5.
+            cache_semantic: Also reuse responses for near-duplicate cache_text;
+                pass False when the response quotes cache_text verbatim
             **kwargs: Additional parameters for the API
 
         Returns:
             Dict containing the response from Anthropic
 
         Raises:
-            httpx.HTTPError: If the API request fails
+            aiohttp.ClientResponseError / httpx.HTTPStatusError: If the API
+                request fails
         """
         messages: List[Dict[str, str]] = []
 
@@ -82,33 +382,43 @@ class LavaAgent:
 
         # Add system prompt if provided (separate field in Anthropic)
         if system_prompt:
-            payload["system"] = system_prompt
+            payload["system"] = self._system_blocks(system_prompt)
+
+        use_cache = self.response_cache is not None and cache_text and temperature <= 0.5
+        if use_cache:
+            # Everything except cache_text has to match exactly
+            cache_scope = hashlib.sha256(orjson.dumps(
+                {**payload, "messages": [{"role": "user", "content": prompt.replace(cache_text, "")}]},
+                option=orjson.OPT_SORT_KEYS,
+            )).hexdigest()
+            # The cache embeds the text (blocking), so keep it off the event loop
+            cached = await asyncio.to_thread(
+                self.response_cache.get, cache_text, scope=cache_scope, semantic=cache_semantic
+            )
+            if cached is not None:
+                return cached
 
         # Make API request with retry logic for rate limiting
         max_retries = 5
         base_delay = 2.0  # Start with 2 second delay
-        
+
         for attempt in range(max_retries):
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        self.base_url,
-                        headers=self._get_headers(),
-                        json=payload,
-                        timeout=60.0,
-                    )
-                    response.raise_for_status()
-                    return response.json()
-                    
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 429:  # Rate limit
-                    if attempt < max_retries - 1:
-                        # Exponential backoff: 2s, 4s, 8s, 16s, 32s
-                        delay = base_delay * (2 ** attempt)
-                        print(f"    Rate limited, waiting {delay}s before retry {attempt + 1}/{max_retries}...")
-                        await asyncio.sleep(delay)
-                        continue
-                raise  # Re-raise if not rate limit or final attempt
+            async with self._post(payload) as response:
+                rate_limited = response.status_code == 429 and attempt < max_retries - 1
+                if not rate_limited:
+                    response.raise_for_status()  # Non-rate-limit error or final attempt
+                    result = orjson.loads(await response.aread())
+                    if use_cache:
+                        await asyncio.to_thread(self.response_cache.put, cache_text, result, scope=cache_scope)
+                    return result
+
+                delay = _retry_delay(response.headers, attempt, base_delay)
+
+            logger.warning(
+                "Rate limited, waiting %.1fs before retry %d/%d...",
+                delay, attempt + 1, max_retries,
+            )
+            await asyncio.sleep(delay)
 
     async def call_with_prompt_file(
         self,
@@ -131,14 +441,8 @@ class LavaAgent:
         Returns:
             Dict containing the response from Anthropic
         """
-        # Load prompt from file
-        prompt_path = Path(__file__).parent / "prompts" / f"{prompt_name}.txt"
-        
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
-
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            prompt_template = f.read()
+        # Load prompt from file (read once, then served from memory)
+        prompt_template = _load_prompt(prompt_name)
 
         # Substitute variables if provided
         if variables:
@@ -201,25 +505,46 @@ class LavaAgent:
         }
 
         if system_prompt:
-            payload["system"] = system_prompt
-
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
-                self.base_url,
-                headers=self._get_headers(),
-                json=payload,
-                timeout=60.0,
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
+            payload["system"] = self._system_blocks(system_prompt)
+
+        # Retry rate-limited requests (only possible before any chunk is yielded)
+        max_retries = 5
+        base_delay = 2.0
+
+        for attempt in range(max_retries):
+            async with self._post(payload) as response:
+                rate_limited = response.status_code == 429 and attempt < max_retries - 1
+                if not rate_limited:
+                    response.raise_for_status()
+                    async for data in _iter_sse_data(response.aiter_bytes()):
+                        if data == b"[DONE]":
+                            return
                         try:
-                            yield json.loads(data)
-                        except json.JSONDecodeError:
+                            yield orjson.loads(data)
+                        except orjson.JSONDecodeError:
                             continue
+                    return
+
+                delay = _retry_delay(response.headers, attempt, base_delay)
+
+            logger.warning(
+                "Rate limited, waiting %.1fs before retry %d/%d...",
+                delay, attempt + 1, max_retries,
+            )
+            await asyncio.sleep(delay)
+
+
+_default_agent: Optional[LavaAgent] = None
+
 
+def get_default_agent() -> LavaAgent:
+    """
+    Get the process-wide LavaAgent built from settings
 
+    Agents are stateless apart from configuration, so callers that don't need
+    a custom one share this instance instead of constructing one per request.
+    """
+    global _default_agent
+    if _default_agent is None:
+        _default_agent = LavaAgent()
+    return _default_agent
@@ -0,0 +1,82 @@
+"""
+Cross-encoder reranker that reorders retrieved regulations before the LLM sees them
+"""
+
+from typing import Dict, List, Optional
+
+from sentence_transformers import CrossEncoder
+
+
+class RegulationReranker:
+    """Rerank retrieved regulation clauses against a protocol paragraph"""
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        top_k: int = 10,
+        batch_size: int = 64,
+    ):
+        """
+        Initialize reranker (local, no API needed)
+
+        Args:
+            model_name: Cross-encoder model to load
+            top_k: Maximum regulations to keep (default: 10)
+            batch_size: Pairs scored per forward pass
+        """
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name)
+
+    def score(self, query_text: str, texts: List[str]) -> List[float]:
+        """
+        Score (query, text) pairs in batched forward passes
+
+        Args:
+            query_text: Protocol paragraph
+            texts: Regulation texts
+
+        Returns:
+            Relevance score per text
+        """
+        if not texts:
+            return []
+        pairs = [(query_text, text) for text in texts]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+    def rerank(self, query_text: str, regulations: List[Dict]) -> List[Dict]:
+        """
+        Keep the top-K regulations, best first
+
+        Scores are raw cross-encoder logits, so they are only used to order
+        regulations, never to drop them.
+
+        Args:
+            query_text: Protocol paragraph
+            regulations: Retrieved regulation dicts (must have 'text')
+
+        Returns:
+            Reordered regulations (at most top_k)
+        """
+        if len(regulations) <= 1:
+            return regulations
+        scores = self.score(query_text, [reg['text'] for reg in regulations])
+        ranked = sorted(zip(regulations, scores), key=lambda pair: pair[1], reverse=True)
+        return [reg for reg, _ in ranked[:self.top_k]]
+
+
+_default_reranker: Optional[RegulationReranker] = None
+
+
+def get_default_reranker() -> RegulationReranker:
+    """
+    Get the process-wide RegulationReranker
+
+    The cross-encoder is loaded once and shared by every regulation service
+    instead of once per country.
+    """
+    global _default_reranker
+    if _default_reranker is None:
+        _default_reranker = RegulationReranker()
+    return _default_reranker
@@ -0,0 +1,326 @@
+"""
+Semantic cache for LLM responses keyed by embedding similarity
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+
+class SemanticCache:
+    """In-memory cache that returns stored results for near-duplicate keys"""
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], np.ndarray],
+        threshold: float = 0.97,
+        max_entries: int = 4096,
+    ):
+        """
+        Initialize semantic cache
+
+        Args:
+            embed_fn: Function mapping text to a 1-D embedding vector
+            threshold: Minimum cosine similarity for a semantic hit (default: 0.97)
+            max_entries: Maximum cached entries before the oldest are overwritten
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # Exact-match lookup: sha256(scope, key_text) -> row
+        self._exact: Dict[str, int] = {}
+        # Row-aligned storage (ring buffer once max_entries is reached)
+        self._embeddings: Optional[np.ndarray] = None
+        self._hashes: List[str] = []
+        self._scopes: List[str] = []
+        self._values: List[bytes] = []
+        self._next_row = 0
+        # Last embedding computed by get(), reused by the following put()
+        self._last_key: Optional[str] = None
+        self._last_embedding: Optional[np.ndarray] = None
+        # get/put may run in worker threads (they embed, which blocks)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key_text: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\x00{key_text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, key_text: str) -> np.ndarray:
+        """Embed and L2-normalize key text (memoized for the last key)"""
+        if key_text == self._last_key and self._last_embedding is not None:
+            return self._last_embedding
+
+        embedding = np.asarray(self.embed_fn(key_text), dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+
+        self._last_key = key_text
+        self._last_embedding = embedding
+        return embedding
+
+    def get(self, key_text: str, scope: str = "", semantic: bool = True) -> Optional[Any]:
+        """
+        Look up a cached value
+
+        Args:
+            key_text: Text that is matched semantically
+            scope: Exact-match qualifier; entries only hit within the same scope
+            semantic: Fall back to similarity matching when there is no exact
+                match (False: exact key_text matches only)
+
+        Returns:
+            Deserialized cached value, or None on a miss
+        """
+        with self._lock:
+            row = self._exact.get(self._hash(key_text, scope))
+            if row is not None:
+                return orjson.loads(self._values[row])
+            if not semantic:
+                return None
+
+            candidates = [i for i, s in enumerate(self._scopes) if s == scope]
+            if not candidates:
+                return None
+
+            # Cosine similarity against stored (normalized) embeddings in this scope
+            query = self._embed(key_text)
+            similarities = self._embeddings[candidates] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return orjson.loads(self._values[candidates[best]])
+
+            return None
+
+    def put(self, key_text: str, value: Any, scope: str = ""):
+        """
+        Store a value in the cache
+
+        Args:
+            key_text: Text that is matched semantically
+            value: JSON-serializable value to cache
+            scope: Exact-match qualifier (see get)
+        """
+        with self._lock:
+            key_hash = self._hash(key_text, scope)
+            if key_hash in self._exact:
+                return
+
+            embedding = self._embed(key_text)
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+
+            row = self._next_row
+            serialized = orjson.dumps(value)
+            if row < len(self._values):
+                # Overwrite the oldest entry
+                del self._exact[self._hashes[row]]
+                self._hashes[row] = key_hash
+                self._scopes[row] = scope
+                self._values[row] = serialized
+            else:
+                self._hashes.append(key_hash)
+                self._scopes.append(scope)
+                self._values.append(serialized)
+
+            self._embeddings[row] = embedding
+            self._exact[key_hash] = row
+            self._next_row = (row + 1) % self.max_entries
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._exact.clear()
+            self._hashes.clear()
+            self._scopes.clear()
+            self._values.clear()
+            self._next_row = 0
+
+
+class PersistentSemanticCache(SemanticCache):
+    """
+    Semantic cache persisted to disk and shared between worker processes
+
+    Embeddings live in a preallocated float32 file (``<path>.f32``, header
+    ``<II`` = total writes, dim) that every process maps read-only, so the OS
+    page cache holds a single copy. Values live in a SQLite sidecar
+    (``<path>.db``, WAL mode) whose row ids index the embedding rows. Writers
+    serialize on a file lock; readers never block.
+    """
+
+    _HEADER = struct.Struct("<II")
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], np.ndarray],
+        path: str,
+        threshold: float = 0.97,
+        max_entries: int = 100_000,
+    ):
+        """
+        Initialize persistent semantic cache
+
+        Args:
+            embed_fn: Function mapping text to a 1-D embedding vector
+            path: File prefix for the cache files (directories are created)
+            threshold: Minimum cosine similarity for a semantic hit (default: 0.97)
+            max_entries: Capacity of a newly created cache file; the oldest
+                rows are overwritten once it is full
+        """
+        super().__init__(embed_fn, threshold=threshold, max_entries=max_entries)
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._embeddings_path = f"{path}.f32"
+        self._lock_path = f"{path}.lock"
+
+        self._db = sqlite3.connect(f"{path}.db", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "rowid INTEGER PRIMARY KEY, key_hash TEXT UNIQUE, scope TEXT, "
+            "response TEXT, created_at INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_scope ON entries (scope)")
+        self._db.commit()
+
+        self._mmap: Optional[mmap.mmap] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._open_embeddings()
+
+    def _open_embeddings(self) -> bool:
+        """Map the embeddings file read-only if it exists (it is created on first put)"""
+        if self._matrix is not None:
+            return True
+        try:
+            with open(self._embeddings_path, "rb") as f:
+                header = f.read(self._HEADER.size)
+                if len(header) < self._HEADER.size:
+                    return False
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return False
+
+        _, dim = self._HEADER.unpack(header)
+        self._matrix = np.frombuffer(
+            self._mmap, dtype=np.float32, offset=self._HEADER.size
+        ).reshape(-1, dim)
+        return True
+
+    def get(self, key_text: str, scope: str = "", semantic: bool = True) -> Optional[Any]:
+        """
+        Look up a cached value
+
+        Args:
+            key_text: Text that is matched semantically
+            scope: Exact-match qualifier; entries only hit within the same scope
+            semantic: Fall back to similarity matching when there is no exact
+                match (False: exact key_text matches only)
+
+        Returns:
+            Deserialized cached value, or None on a miss
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM entries WHERE key_hash = ?",
+                (self._hash(key_text, scope),),
+            ).fetchone()
+            if row is not None:
+                return orjson.loads(row[0])
+            if not semantic:
+                return None
+
+            candidates = [r for (r,) in self._db.execute(
+                "SELECT rowid FROM entries WHERE scope = ?", (scope,)
+            )]
+            if not candidates or not self._open_embeddings():
+                return None
+
+            query = self._embed(key_text)
+            if query.shape[0] != self._matrix.shape[1]:
+                # Written by another embedding model - nothing comparable
+                return None
+            similarities = np.dot(self._matrix[candidates], query)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            # Another process may have reused the row since candidates were read
+            row = self._db.execute(
+                "SELECT response FROM entries WHERE rowid = ? AND scope = ?",
+                (candidates[best], scope),
+            ).fetchone()
+            return orjson.loads(row[0]) if row is not None else None
+
+    def put(self, key_text: str, value: Any, scope: str = ""):
+        """
+        Store a value in the cache
+
+        Args:
+            key_text: Text that is matched semantically
+            value: JSON-serializable value to cache
+            scope: Exact-match qualifier (see get)
+        """
+        with self._lock:
+            key_hash = self._hash(key_text, scope)
+            embedding = self._embed(key_text)
+            response = orjson.dumps(value).decode("utf-8")
+
+            with open(self._lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+                if self._db.execute(
+                    "SELECT 1 FROM entries WHERE key_hash = ?", (key_hash,)
+                ).fetchone():
+                    return
+
+                fd = os.open(self._embeddings_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    header = os.pread(fd, self._HEADER.size, 0)
+                    if len(header) < self._HEADER.size:
+                        # New file: preallocate all rows so the mapping never grows
+                        count, dim = 0, embedding.shape[0]
+                        os.ftruncate(fd, self._HEADER.size + self.max_entries * dim * 4)
+                    else:
+                        count, dim = self._HEADER.unpack(header)
+                        if dim != embedding.shape[0]:
+                            raise ValueError(
+                                f"Cache file {self._embeddings_path} holds {dim}-d embeddings, "
+                                f"got {embedding.shape[0]}-d (embedding model changed)"
+                            )
+                    capacity = (os.fstat(fd).st_size - self._HEADER.size) // (dim * 4)
+                    row = count % capacity
+
+                    # Unpublish the row before overwriting its embedding
+                    self._db.execute("DELETE FROM entries WHERE rowid = ?", (row,))
+                    self._db.commit()
+
+                    os.pwrite(fd, embedding.tobytes(), self._HEADER.size + row * dim * 4)
+                    os.pwrite(fd, self._HEADER.pack(count + 1, dim), 0)
+                finally:
+                    os.close(fd)
+
+                self._db.execute(
+                    "INSERT INTO entries (rowid, key_hash, scope, response, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (row, key_hash, scope, response, int(time.time())),
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop every cached entry (embedding rows are reused by later puts)"""
+        with self._lock:
+            with open(self._lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
@@ -2,46 +2,24 @@
 Agent that generates specific diffs to fix compliance violations
 """
 
-import json
 import re
-from typing import Dict, List
-from app.agents.lava_agent import LavaAgent
+import string
+from typing import Dict, List, Optional
 
+import orjson
 
-class ViolationFixAgent:
-    """Agent that generates targeted diffs to fix compliance violations"""
-    
-    def __init__(self):
-        self.agent = LavaAgent()
-    
-    async def fix_violations(
-        self,
-        original_text: str,
-        violations: List[Dict]
-    ) -> Dict:
-        """
-        Generate specific diffs to fix compliance violations
-        
-        Args:
-            original_text: Original protocol text that has violations
-            violations: List of violation details with regulation requirements
-            
-        Returns:
-            Dict with list of specific changes (diffs)
-        """
-        # Format violations for the prompt
-        violations_text = "\n\n".join([
-            f"VIOLATION {i+1}:\n"
-            f"Requirement: {v.get('regulation_text', 'N/A')}\n"
-            f"Issue: {v.get('explanation', 'N/A')}"
-            for i, v in enumerate(violations)
-        ])
-        
-        prompt = f"""
+from app.agents.lava_agent import LavaAgent, get_default_agent
+
+# Compiled once at import instead of looked up in re's cache on every call
+# Opening (```json) and closing (```) fences are stripped in a single pass
+_CODE_FENCE = re.compile(r'```(?:json)?\s*')
+
+# Fix prompt; {num_violations}, {original_text} and {violations_text} are filled per call
+_FIX_PROMPT_TEMPLATE = """
         You are a compliance fixer. Generate MINIMAL, TARGETED changes to fix violations.
 
-        ⚠️ IMPORTANT: THIS TEXT CHUNK HAS {len(violations)} VIOLATIONS TO FIX ⚠️
-        - Address ALL {len(violations)} violations in your response
+        ⚠️ IMPORTANT: THIS TEXT CHUNK HAS {num_violations} VIOLATIONS TO FIX ⚠️
+        - Address ALL {num_violations} violations in your response
         - Each violation may require separate changes
         - Generate multiple changes if needed to fix all violations
         - Prioritize critical violations first
@@ -50,10 +28,10 @@ class ViolationFixAgent:
         ORIGINAL TEXT:
         {original_text}
 
-        VIOLATIONS TO FIX ({len(violations)} total):
+        VIOLATIONS TO FIX ({num_violations} total):
         {violations_text}
 
-        Generate ONLY the specific changes needed to fix ALL {len(violations)} violations above.
+        Generate ONLY the specific changes needed to fix ALL {num_violations} violations above.
         Return as JSON array with changes for EACH violation:
         [
           {{
@@ -83,9 +61,9 @@ class ViolationFixAgent:
         5. Include enough context so text is unique
         6. Generate 1-2 changes per violation (if there are 3 violations, expect ~3-6 changes)
         7. Prefer "replace" over "add"+"delete"
-        8. **MUST address ALL {len(violations)} violations** - do not skip any
+        8. **MUST address ALL {num_violations} violations** - do not skip any
         9. Label each change with which violation it addresses
-        
+
         Example (for 2 violations):
         [
           {{
@@ -103,12 +81,119 @@ class ViolationFixAgent:
             "addresses_violation": 2
           }}
         ]
+
+        ⚠️ CRITICAL: If there are {num_violations} violations, generate changes to address ALL {num_violations} violations! ⚠️
+        """
+
+# Pre-split into (literal, field) pairs once, so each call only joins strings
+_FIX_PROMPT_PARTS = tuple(
+    (literal, field) for literal, field, _, _ in string.Formatter().parse(_FIX_PROMPT_TEMPLATE)
+)
+
+
+def _render_fix_prompt(values: Dict[str, str]) -> str:
+    """Fill _FIX_PROMPT_TEMPLATE without re-parsing it"""
+    return "".join(
+        literal + values[field] if field else literal
+        for literal, field in _FIX_PROMPT_PARTS
+    )
+
+
+def _find_json_array(text: str) -> Optional[str]:
+    """
+    Return the first balanced top-level JSON array in text
+
+    A single linear scan of bracket depth (ignoring brackets inside JSON
+    strings), so trailing prose containing brackets is not swallowed.
+
+    Args:
+        text: Raw LLM response
+
+    Returns:
+        The array substring, or None if no balanced array is found
+    """
+    start = text.find('[')
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return None
+
+
+class ViolationFixAgent:
+    """Agent that generates targeted diffs to fix compliance violations"""
+    
+    def __init__(self, agent: Optional[LavaAgent] = None):
+        """
+        Initialize violation fix agent
+        
+        Args:
+            agent: LLM agent to use (e.g. one with a response cache); defaults
+                to the shared process-wide LavaAgent
+        """
+        self.agent = agent or get_default_agent()
+    
+    async def fix_violations(
+        self,
+        original_text: str,
+        violations: List[Dict]
+    ) -> Dict:
+        """
+        Generate specific diffs to fix compliance violations
         
-        ⚠️ CRITICAL: If there are {len(violations)} violations, generate changes to address ALL {len(violations)} violations! ⚠️
+        Args:
+            original_text: Original protocol text that has violations
+            violations: List of violation details with regulation requirements
+            
+        Returns:
+            Dict with list of specific changes (diffs)
         """
+        # Format violations for the prompt (appended into one list, joined once)
+        parts = []
+        append = parts.append
+        for i, v in enumerate(violations, 1):
+            if i > 1:
+                append("\n\n")
+            append("VIOLATION ")
+            append(str(i))
+            append(":\nRequirement: ")
+            append(str(v.get('regulation_text', 'N/A')))
+            append("\nIssue: ")
+            append(str(v.get('explanation', 'N/A')))
+        violations_text = "".join(parts)
+        
+        prompt = _render_fix_prompt({
+            "num_violations": str(len(violations)),
+            "original_text": original_text,
+            "violations_text": violations_text,
+        })
         
         try:
-            response = await self.agent.call(prompt, temperature=0.3)
+            # Prompts for the same violations differ only in the protocol text.
+            # Fixes quote exact snippets of it, so only identical text may hit.
+            response = await self.agent.call(
+                prompt, temperature=0.3, cache_text=original_text, cache_semantic=False
+            )
             response_text = self.agent.get_text_response(response)
             
             # Extract JSON from response
@@ -138,19 +223,14 @@ class ViolationFixAgent:
     def _extract_and_clean_json(self, response_text: str) -> List[Dict]:
         """Extract and parse JSON from LLM response"""
         # Remove markdown code blocks
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*', '', response_text)
+        response_text = _CODE_FENCE.sub('', response_text)
         
         # Try to extract JSON array
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group()
-        else:
-            json_str = response_text.strip()
+        json_str = _find_json_array(response_text) or response_text.strip()
         
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
             print(f"JSON parse error: {e}")
             return []
 
@@ -1,21 +1,26 @@
 """Health check endpoints"""
 
+import orjson
 from fastapi import APIRouter
+from fastapi.responses import Response
 
 router = APIRouter()
 
+# Probe payloads never change - serialize them once
+_HEALTH_BYTES = orjson.dumps({
+    "status": "healthy",
+    "message": "API is running",
+})
+_PONG_BYTES = orjson.dumps({"message": "pong"})
+
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "message": "API is running",
-    }
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 
 @router.get("/ping")
 async def ping():
     """Ping endpoint"""
-    return {"message": "pong"}
-
+    return Response(content=_PONG_BYTES, media_type="application/json")
@@ -1,23 +1,49 @@
 """API endpoints for regulation processing"""
 
 import os
-import math
-import json
-from typing import List
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-import fitz  # PyMuPDF
+import orjson
 
+from app.core.config import settings
+from app.core.pdf import pdf_to_markdown
 from app.services import RegulationService
 from app.agents.violation_fix_agent import ViolationFixAgent
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Chunk size for streaming uploaded files to disk
+UPLOAD_CHUNK_SIZE = 1 << 16
+
+# Extracted PDFs by upload SHA-256 (see _ExtractedPDF), so a "check then fix"
+# round trip over the same file extracts and chunks it only once
+PDF_CACHE_SIZE = 16
+_pdf_cache: "OrderedDict[str, _ExtractedPDF]" = OrderedDict()
 
 # Initialize services per country (one instance per country)
 _regulation_services = {}
+_regulation_services_lock = threading.Lock()
+
+# Map country names to directory names
+_COUNTRY_DIRS = {
+    "USA": "usa",
+    "EU": "eu",
+    "JAPAN": "japan",
+}
 
 
 def get_regulation_service(country: str = "USA"):
@@ -30,50 +56,211 @@ def get_regulation_service(country: str = "USA"):
     Returns:
         RegulationService instance for the country
     """
-    global _regulation_services
-    country_normalized = country.upper()
-    
-    # Map country names to directory names
-    country_map = {
-        "USA": "usa",
-        "EU": "eu", 
-        "JAPAN": "japan"
-    }
+    country_dir = _COUNTRY_DIRS.get(country.upper()) or country.lower()
+    
+    service = _regulation_services.get(country_dir)
+    if service is None:
+        # Double-checked so concurrent cold starts build the service only once
+        with _regulation_services_lock:
+            service = _regulation_services.get(country_dir)
+            if service is None:
+                service = _regulation_services[country_dir] = RegulationService(country=country_dir)
+    
+    return service
+
+
+def warm_up_regulation_services(countries: List[str]):
+    """
+    Create regulation services ahead of traffic (called at app startup)
+    
+    Loads the embedding models and graphs and runs a dummy retrieval, so the
+    first real request does not pay the initialization cost. Countries are
+    warmed up in parallel threads (model loading is mostly I/O and native code).
+    Failures are logged and skipped; that country then loads on first use.
+    
+    Args:
+        countries: Country codes to warm up
+    """
+    def warm_up(country: str):
+        try:
+            service = get_regulation_service(country=country)
+            service.retrieve_with_hipporag(query_text="warmup", country=country, top_k=1)
+        except Exception:
+            logger.exception("Warmup failed for %s", country)
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(countries))) as executor:
+        futures = [executor.submit(warm_up, country) for country in countries]
+        for future in as_completed(futures):
+            future.result()
+
+
+async def _save_upload(
+    file: UploadFile,
+    on_chunk: Optional[Callable[[bytes], None]] = None
+) -> Path:
+    """
+    Stream an uploaded PDF to a unique temp file
     
-    # Get directory name
-    country_dir = country_map.get(country_normalized, country.lower())
+    Copies in UPLOAD_CHUNK_SIZE pieces so memory stays flat regardless of the
+    PDF size; the unique name keeps concurrent uploads of the same filename
+    from colliding.
     
-    if country_dir not in _regulation_services:
-        _regulation_services[country_dir] = RegulationService(country=country_dir)
+    Args:
+        file: Uploaded file
+        on_chunk: Optional callback fed each chunk as it is copied (e.g. a
+            hasher's update)
+        
+    Returns:
+        Path of the temp file (the caller deletes it)
+    """
+    os.makedirs("./data/temp", exist_ok=True)
+    temp_file = tempfile.NamedTemporaryFile(dir="./data/temp", suffix=".pdf", delete=False)
+    temp_path = Path(temp_file.name)
     
-    return _regulation_services[country_dir]
+    try:
+        with temp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                temp_file.write(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    
+    return temp_path
+
+
+@dataclass(slots=True)
+class _ExtractedPDF:
+    """Extracted text of an uploaded PDF and its chunkings"""
+    
+    text: str
+    page_ends: List[int]  # Offset in text just past each page
+    offsets: Dict[int, List[Tuple[int, int]]]  # Requested num_chunks -> chunk offsets
 
 
-def pdf_to_markdown(pdf_path: str) -> str:
+def _chunk_offsets(text: str, page_ends: List[int], num_chunks: int) -> List[Tuple[int, int]]:
     """
-    Convert PDF to plain text preserving original formatting
+    Split text into at most num_chunks contiguous ranges of similar length
+    
+    Chunks end on page boundaries; pages longer than a chunk may also be cut
+    at a line break, so a single huge page still spreads over several chunks.
+    These boundaries differ from the paragraph-based _chunk_text split used
+    before, so chunk indices from older /check-pdf-compliance responses do not
+    map onto them. Whitespace-only ranges (blank pages) are skipped, since
+    each chunk costs an LLM call.
     
     Args:
-        pdf_path: Path to PDF file
+        text: Extracted PDF text
+        page_ends: Offset in text just past each page
+        num_chunks: Maximum number of chunks
         
     Returns:
-        Plain text with preserved line breaks
+        (start, end) offsets per chunk
+    """
+    total = len(text)
+    if total == 0:
+        return []
+    target = total / num_chunks
+    
+    offsets = []
+    start = 0
+    page_start = 0
+    for page_end in page_ends:
+        boundaries = []
+        if page_end - page_start > target:
+            newline = text.find("\n", page_start, page_end - 1)
+            while newline != -1:
+                boundaries.append(newline + 1)
+                newline = text.find("\n", newline + 1, page_end - 1)
+        boundaries.append(page_end)
+        
+        # Close the current chunk once it reaches its share of the text
+        for boundary in boundaries:
+            if boundary >= (len(offsets) + 1) * target:
+                if text[start:boundary].strip():
+                    offsets.append((start, boundary))
+                start = boundary
+        page_start = page_end
+    
+    if text[start:total].strip():
+        offsets.append((start, total))
+    return offsets
+
+
+def _cached_pdf_text(
+    pdf_hash: str,
+    num_chunks: int
+) -> Optional[Tuple[str, List[Tuple[int, int]]]]:
     """
-    doc = fitz.open(pdf_path)
-    all_text = []
+    Look up a previously extracted PDF by the SHA-256 of its bytes
     
-    for page in doc:
-        # Get text with layout preserved
-        text = page.get_text("text")
-        if text.strip():
-            all_text.append(text)
+    Args:
+        pdf_hash: SHA-256 hex digest of the uploaded bytes
+        num_chunks: Number of chunks requested; the same count always yields
+            the same offsets, so /fix-pdf-violations sees the checked chunks
+        
+    Returns:
+        (pdf_text, chunk_offsets), or None if the PDF is not cached
+    """
+    cached = _pdf_cache.get(pdf_hash)
+    if cached is None:
+        return None
+    
+    _pdf_cache.move_to_end(pdf_hash)
+    offsets = cached.offsets.get(num_chunks)
+    if offsets is None:
+        offsets = _chunk_offsets(cached.text, cached.page_ends, num_chunks)
+        cached.offsets[num_chunks] = offsets
+    return cached.text, offsets
+
+
+async def _get_pdf_text(
+    service: RegulationService,
+    file: UploadFile,
+    num_chunks: int
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Extract PDF text and page-aligned chunk offsets, reusing a previous
+    extraction of the same file
     
-    doc.close()
+    The upload is read once: it is hashed while it streams to a temp file,
+    which the extraction workers then reopen by path on a cache miss.
+    
+    Args:
+        service: Regulation service used for extraction
+        file: Uploaded PDF
+        num_chunks: Maximum number of chunks the offsets should describe
+        
+    Returns:
+        (pdf_text, chunk_offsets)
+    """
+    hasher = hashlib.sha256()
+    temp_path = await _save_upload(file, hasher.update)
+    pdf_hash = hasher.hexdigest()
+    try:
+        cached = _cached_pdf_text(pdf_hash, num_chunks)
+        if cached is not None:
+            return cached
+        
+        # Parsing is synchronous; keep it off the event loop
+        pages = await asyncio.to_thread(service.extract_pages_from_pdf, str(temp_path))
+    finally:
+        temp_path.unlink(missing_ok=True)
     
-    # Join all pages
-    full_text = "\n".join(all_text)
+    # Same text as extract_text_from_pdf: each page followed by a newline
+    page_ends = []
+    end = 0
+    for page in pages:
+        end += len(page) + 1
+        page_ends.append(end)
+    pdf_text = "".join(page + "\n" for page in pages)
+    offsets = _chunk_offsets(pdf_text, page_ends, num_chunks)
     
-    return full_text
+    _pdf_cache[pdf_hash] = _ExtractedPDF(pdf_text, page_ends, {num_chunks: offsets})
+    if len(_pdf_cache) > PDF_CACHE_SIZE:
+        _pdf_cache.popitem(last=False)
+    return pdf_text, offsets
 
 
 class RegulationUploadResponse(BaseModel):
@@ -144,6 +331,7 @@ class PDFComplianceResponse(BaseModel):
     """Response for full PDF compliance checking"""
     filename: str
     total_chunks: int
+    num_chunks: int  # Requested chunk count; pass it back to /fix-pdf-violations
     processed_chunks: int
     overall_compliance_score: float
     overall_status: str
@@ -178,20 +366,15 @@ async def upload_regulation(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Save uploaded file temporarily
-    temp_path = f"./data/temp/{file.filename}"
-    import os
-    os.makedirs("./data/temp", exist_ok=True)
+    service = get_regulation_service(country=country)
     
-    with open(temp_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Stream the upload to a temp file
+    temp_path = await _save_upload(file)
     
-    # Process regulation
-    service = get_regulation_service(country=country)
     try:
+        # Process regulation
         reg_doc = await service.ingest_regulation(
-            pdf_path=temp_path,
+            pdf_path=str(temp_path),
             country=country,
             authority=authority,
             title=title,
@@ -210,8 +393,7 @@ async def upload_regulation(
     
     finally:
         # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        temp_path.unlink(missing_ok=True)
 
 
 @router.post("/retrieve", response_model=RetrievalResponse)
@@ -227,22 +409,21 @@ async def retrieve_regulations(query: RetrievalQuery):
     """
     service = get_regulation_service(country=query.country)
     
-    results = service.retrieve_with_hipporag(
+    # Embedding + PageRank are CPU-bound; keep them off the event loop
+    results = await asyncio.to_thread(
+        service.retrieve_with_hipporag,
         query_text=query.query_text,
         country=query.country,
         top_k=query.top_k,
     )
     
-    retrieval_results = [
-        RetrievalResult(**result)
-        for result in results
-    ]
-    
-    return RetrievalResponse(
+    # Trusted server-built data - construct without validation (which also
+    # drops keys outside the schema) and serialize with orjson
+    return ORJSONResponse(RetrievalResponse.model_construct(
         query=query.query_text,
-        results=retrieval_results,
-        num_results=len(retrieval_results),
-    )
+        results=[RetrievalResult.model_construct(**result) for result in results],
+        num_results=len(results),
+    ).model_dump())
 
 
 @router.get("/graph/stats")
@@ -257,11 +438,66 @@ async def get_graph_stats(country: str = "USA"):
     return service.graph_builder.get_stats()
 
 
+# Nodes/edges serialized per streamed chunk of /graph/data
+GRAPH_STREAM_BATCH_SIZE = 1000
+
+
+def _node_payload(item) -> dict:
+    """Visualization payload for a (node_id, attributes) pair"""
+    node_id, node_data = item
+    # Read the live attribute dict (no copy), binding .get once
+    get = node_data.get
+    return {
+        "id": node_id,
+        "type": get("type", "unknown"),
+        "text": get("text", ""),
+        "section": get("section", ""),
+        "clause_number": get("clause_number", ""),
+        "requirement_type": get("requirement_type", ""),
+        "severity": get("severity", ""),
+    }
+
+
+def _edge_payload(item) -> dict:
+    """Visualization payload for a (source, target, attributes) triple"""
+    source, target, edge_data = item
+    get = edge_data.get
+    return {
+        "source": source,
+        "target": target,
+        "relation": get("relation", ""),
+        "confidence": get("confidence", 0.0),
+        "source_type": get("source", ""),
+    }
+
+
+def _stream_json_items(items: list, to_payload) -> Iterator[bytes]:
+    """Yield comma-separated JSON for items, one batch per chunk"""
+    for i in range(0, len(items), GRAPH_STREAM_BATCH_SIZE):
+        batch = b",".join(
+            orjson.dumps(to_payload(item))
+            for item in items[i:i + GRAPH_STREAM_BATCH_SIZE]
+        )
+        yield b"," + batch if i else batch
+
+
+def _stream_graph_data(nodes: list, edges: list, stats: dict) -> Iterator[bytes]:
+    """Yield the /graph/data JSON document incrementally"""
+    yield b'{"nodes":['
+    yield from _stream_json_items(nodes, _node_payload)
+    yield b'],"edges":['
+    yield from _stream_json_items(edges, _edge_payload)
+    yield b'],"stats":' + orjson.dumps(stats) + b'}'
+
+
 @router.get("/graph/data")
 async def get_graph_data(country: str = "USA"):
     """
     Get complete knowledge graph data for visualization
     
+    The JSON document is streamed in batches, so memory stays flat and the
+    client starts receiving data immediately on large graphs.
+    
     Args:
         country: Country code (USA, EU, Japan)
         
@@ -271,36 +507,16 @@ async def get_graph_data(country: str = "USA"):
     service = get_regulation_service(country=country)
     graph = service.graph_builder.graph
     
-    # Extract nodes
-    nodes = []
-    for node_id in graph.nodes():
-        node_data = dict(graph.nodes[node_id])
-        nodes.append({
-            "id": node_id,
-            "type": node_data.get("type", "unknown"),
-            "text": node_data.get("text", ""),
-            "section": node_data.get("section", ""),
-            "clause_number": node_data.get("clause_number", ""),
-            "requirement_type": node_data.get("requirement_type", ""),
-            "severity": node_data.get("severity", ""),
-        })
-    
-    # Extract edges
-    edges = []
-    for source, target, edge_data in graph.edges(data=True):
-        edges.append({
-            "source": source,
-            "target": target,
-            "relation": edge_data.get("relation", ""),
-            "confidence": edge_data.get("confidence", 0.0),
-            "source_type": edge_data.get("source", ""),
-        })
+    # Snapshot the views (references only) so concurrent uploads can't change
+    # the graph mid-stream; serialization runs in the threadpool
+    nodes = list(graph.nodes(data=True))
+    edges = list(graph.edges(data=True))
+    stats = service.graph_builder.get_stats()
     
-    return {
-        "nodes": nodes,
-        "edges": edges,
-        "stats": service.graph_builder.get_stats(),
-    }
+    return StreamingResponse(
+        _stream_graph_data(nodes, edges, stats),
+        media_type="application/json",
+    )
 
 
 @router.post("/check-compliance", response_model=ComplianceCheckResponse)
@@ -345,7 +561,9 @@ async def check_protocol_compliance(request: ComplianceCheckRequest):
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         
-        return ComplianceCheckResponse(**result)
+        # Trusted server-built data - construct without validation (which also
+        # drops keys outside the schema, e.g. "note") and serialize with orjson
+        return ORJSONResponse(ComplianceCheckResponse.model_construct(**result).model_dump())
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Compliance check failed: {str(e)}")
@@ -365,8 +583,8 @@ async def check_pdf_compliance(
     This endpoint:
     1. Extracts text from uploaded PDF
     2. Chunks the PDF into N parts (default 12)
-    3. Uses concurrent.futures to send all chunks to LavaLabs in parallel
-    4. For each chunk, retrieves relevant regulations using HippoRAG
+    3. For each chunk, retrieves relevant regulations using HippoRAG
+    4. Sends the chunks to LavaLabs a few per request, all requests in parallel
     5. Returns aggregated compliance results
     
     Args:
@@ -386,99 +604,71 @@ async def check_pdf_compliance(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Save uploaded file temporarily
-    temp_path = f"./data/temp/{file.filename}"
-    os.makedirs("./data/temp", exist_ok=True)
-    
     try:
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Get service and extract PDF text
+        # Get service and extract PDF text straight from the upload
+        # (cached for the follow-up fix request)
         service = get_regulation_service(country=country)
-        pdf_text = service.extract_text_from_pdf(temp_path)
+        pdf_text, chunk_offsets = await _get_pdf_text(service, file, num_chunks)
         
         if not pdf_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from PDF")
         
-        # Chunk the PDF text
-        chunk_size = math.ceil(len(pdf_text) / num_chunks)
-        chunks = service._chunk_text(pdf_text, chunk_size)
-        
-        # Ensure we have the right number of chunks
-        if len(chunks) > num_chunks:
-            # Merge smaller chunks
-            target_chunk_size = math.ceil(len(pdf_text) / num_chunks)
-            chunks = service._chunk_text(pdf_text, target_chunk_size)
+        # Page-aligned chunks (the same ranges /fix-pdf-violations slices)
+        chunks = [pdf_text[start:end].strip() for start, end in chunk_offsets]
         
         print(f"PDF split into {len(chunks)} chunks")
         
-        # Function to process a single chunk
-        async def process_chunk(chunk_index: int, chunk_text: str):
-            """Process a single chunk with compliance checking"""
-            try:
-                # Use existing check_protocol_compliance method
-                result = await service.check_protocol_compliance(
-                    protocol_paragraph=chunk_text,
-                    country=country,
-                    top_k=top_k
-                )
-                
-                return PDFChunkResult(
-                    chunk_index=chunk_index,
-                    chunk_text=chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
-                    total_regulations_checked=result.get("total_regulations_checked", 0),
-                    compliant_count=result.get("compliant_count", 0),
-                    non_compliant_count=result.get("non_compliant_count", 0),
-                    compliance_score=result.get("overall_compliance_score", 0.0),
-                    status=result.get("status", "ERROR"),
-                    violations=[
-                        v for v in result.get("detailed_results", [])
-                        if not v.get("is_compliant")
-                    ]
-                )
-            except Exception as e:
-                print(f"Error processing chunk {chunk_index}: {e}")
-                return PDFChunkResult(
-                    chunk_index=chunk_index,
-                    chunk_text=chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
-                    total_regulations_checked=0,
-                    compliant_count=0,
-                    non_compliant_count=0,
-                    compliance_score=0.0,
-                    status="ERROR",
-                    violations=[]
-                )
+        # Retrieve per chunk, then check several chunks per LLM call
+        results = await service.check_protocols_batch(
+            protocol_paragraphs=chunks,
+            country=country,
+            top_k=top_k
+        )
         
-        # Process all chunks concurrently using asyncio.gather
-        import asyncio
-        tasks = [process_chunk(i, chunk) for i, chunk in enumerate(chunks)]
-        chunk_results = await asyncio.gather(*tasks)
+        # Server-built from trusted agent output - skip validation
+        chunk_results = [
+            PDFChunkResult.model_construct(
+                chunk_index=chunk_index,
+                chunk_text=chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
+                total_regulations_checked=result.get("total_regulations_checked", 0),
+                compliant_count=result.get("compliant_count", 0),
+                non_compliant_count=result.get("non_compliant_count", 0),
+                compliance_score=result.get("overall_compliance_score", 0.0),
+                status=result.get("status", "ERROR"),
+                violations=[
+                    v for v in result.get("detailed_results", [])
+                    if not v.get("is_compliant")
+                ]
+            )
+            for chunk_index, (chunk_text, result) in enumerate(zip(chunks, results))
+        ]
         
-        # Calculate overall statistics
-        total_regulations = sum(r.total_regulations_checked for r in chunk_results)
-        total_compliant = sum(r.compliant_count for r in chunk_results)
-        total_non_compliant = sum(r.non_compliant_count for r in chunk_results)
+        # Calculate overall statistics (including critical violations) in one pass
+        total_regulations = 0
+        total_compliant = 0
+        total_non_compliant = 0
+        critical_violations = 0
+        for result in chunk_results:
+            total_regulations += result.total_regulations_checked
+            total_compliant += result.compliant_count
+            total_non_compliant += result.non_compliant_count
+            for v in result.violations:
+                if v.get("severity") == "critical":
+                    critical_violations += 1
         
         # Overall compliance score (weighted average)
         overall_score = 0.0
         if total_regulations > 0:
             overall_score = total_compliant / total_regulations
         
-        # Count critical violations
-        critical_violations = 0
-        for result in chunk_results:
-            critical_violations += sum(
-                1 for v in result.violations
-                if v.get("severity") == "critical"
-            )
-        
         processing_time = time.time() - start_time
         
-        return PDFComplianceResponse(
+        # Trusted server-built data - construct without validation and
+        # serialize with orjson (response_model still documents the schema)
+        return ORJSONResponse(PDFComplianceResponse.model_construct(
             filename=file.filename,
             total_chunks=len(chunks),
+            num_chunks=num_chunks,
             processed_chunks=len(chunk_results),
             overall_compliance_score=round(overall_score, 3),
             overall_status="COMPLIANT" if total_non_compliant == 0 else "NON_COMPLIANT",
@@ -486,15 +676,10 @@ async def check_pdf_compliance(
             critical_violations=critical_violations,
             chunk_results=chunk_results,
             processing_time_seconds=round(processing_time, 2)
-        )
+        ).model_dump())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF compliance check failed: {str(e)}")
-    
-    finally:
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
 
 @router.post("/fix-pdf-violations")
@@ -502,6 +687,7 @@ async def fix_pdf_violations(
     file: UploadFile = File(...),
     compliance_results: str = Form(...),
     country: str = Form("USA"),
+    num_chunks: Optional[int] = Form(None),
 ):
     """
     Generate targeted diffs to fix compliance violations
@@ -513,16 +699,18 @@ async def fix_pdf_violations(
     4. Returns list of changes with context
     
     Args:
-        file: Original PDF file
+        file: Original PDF file (always required: the text extracted by the
+            check is only cached per worker process, so it is reused when
+            this worker still holds it and re-extracted otherwise)
         compliance_results: JSON string of compliance check results
         country: Country code (USA, EU, Japan)
+        num_chunks: Chunk count the check was requested with (defaults to
+            the num_chunks in compliance_results; required in one of them)
         
     Returns:
         JSON with list of diffs and metadata
     """
     import time
-    import json
-    import asyncio
     
     start_time = time.time()
     
@@ -532,64 +720,61 @@ async def fix_pdf_violations(
     
     # Parse compliance results
     try:
-        results = json.loads(compliance_results)
-    except json.JSONDecodeError:
+        results = orjson.loads(compliance_results)
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid compliance results JSON")
     
-    # Save uploaded file temporarily
-    temp_path = f"./data/temp/{file.filename}"
-    os.makedirs("./data/temp", exist_ok=True)
+    # The requested count, not total_chunks: chunking can produce fewer
+    # chunks, and re-chunking by that count would move the boundaries.
+    # Guessing a default would silently slice different chunks.
+    num_chunks = num_chunks or results.get("num_chunks")
+    if not isinstance(num_chunks, int) or num_chunks < 1:
+        raise HTTPException(
+            status_code=400,
+            detail="num_chunks is required (the value /check-pdf-compliance was called with)"
+        )
     
     try:
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Get service and extract PDF text
         service = get_regulation_service(country=country)
-        pdf_text = service.extract_text_from_pdf(temp_path)
+        pdf_text, chunk_offsets = await _get_pdf_text(service, file, num_chunks)
         
-        # Initialize fix agent
-        fix_agent = ViolationFixAgent()
+        # Initialize fix agent (shares the service's cached LLM agent)
+        fix_agent = ViolationFixAgent(agent=service.agent)
         
         # Process chunks with violations
         chunk_results = results.get("chunk_results", [])
         fixed_chunks = []
         
+        # Bound in-flight fix requests so a large PDF does not trigger 429s
+        fix_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_CHUNKS)
+        
         async def fix_chunk(chunk_data):
             """Fix a single chunk if it has violations"""
             violations = chunk_data.get("violations", [])
             chunk_index = chunk_data.get("chunk_index")
             
-            # Get full chunk text from original PDF
-            num_chunks = results.get("total_chunks", 12)
-            chunk_size = math.ceil(len(pdf_text) / num_chunks)
-            start_idx = chunk_index * chunk_size
-            end_idx = min(start_idx + chunk_size, len(pdf_text))
-            full_chunk_text = pdf_text[start_idx:end_idx]
-            
             if len(violations) == 0:
-                # No violations, keep original text exactly as is
+                # No violations, original text stays as is (only changes are returned,
+                # so the chunk text is never sliced out)
                 return {
                     "chunk_index": chunk_index,
-                    "text": full_chunk_text,  # Use full original text
                     "was_fixed": False
                 }
             
+            # Get full chunk text from original PDF (only chunks being fixed are copied)
+            if 0 <= chunk_index < len(chunk_offsets):
+                start_idx, end_idx = chunk_offsets[chunk_index]
+            else:
+                start_idx = end_idx = len(pdf_text)
+            full_chunk_text = pdf_text[start_idx:end_idx]
             
             # Prepare violation details with regulation text
+            graph = service.graph_builder.graph
             violations_with_context = []
             for v in violations:
                 reg_id = v.get("regulation_id")
-                # Try to find the regulation text from graph
-                reg_node = next(
-                    (n for n in service.graph_builder.graph.nodes() 
-                     if n == reg_id), 
-                    None
-                )
-                reg_text = ""
-                if reg_node:
-                    reg_text = service.graph_builder.graph.nodes[reg_node].get("text", "")
+                # Look up the regulation text in the graph (nodes are dict-indexed)
+                reg_text = graph.nodes[reg_id].get("text", "") if reg_id in graph else ""
                 
                 violations_with_context.append({
                     "regulation_id": reg_id,
@@ -599,10 +784,11 @@ async def fix_pdf_violations(
                 })
             
             # Call fix agent to generate diffs
-            fix_result = await fix_agent.fix_violations(
-                original_text=full_chunk_text,
-                violations=violations_with_context
-            )
+            async with fix_semaphore:
+                fix_result = await fix_agent.fix_violations(
+                    original_text=full_chunk_text,
+                    violations=violations_with_context
+                )
             
             return {
                 "chunk_index": chunk_index,
@@ -625,7 +811,7 @@ async def fix_pdf_violations(
         print(f"Generated {len(all_changes)} changes in {processing_time:.2f} seconds")
         
         # Return list of changes as JSON
-        return JSONResponse({
+        return ORJSONResponse({
             "changes": all_changes,
             "original_filename": file.filename,
             "total_changes": len(all_changes),
@@ -635,11 +821,6 @@ async def fix_pdf_violations(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fix violations: {str(e)}")
-    
-    finally:
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
 
 @router.post("/pdf-to-markdown")
@@ -659,19 +840,16 @@ async def convert_pdf_to_markdown(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Save uploaded file temporarily
-    temp_path = f"./data/temp/{file.filename}"
-    os.makedirs("./data/temp", exist_ok=True)
+    temp_path = None
     
     try:
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream the upload to a temp file
+        temp_path = await _save_upload(file)
         
         # Convert to markdown
-        markdown_content = pdf_to_markdown(temp_path)
+        markdown_content = await pdf_to_markdown(str(temp_path))
         
-        return JSONResponse({
+        return ORJSONResponse({
             "markdown": markdown_content,
             "filename": file.filename
         })
@@ -681,8 +859,8 @@ async def convert_pdf_to_markdown(
     
     finally:
         # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
 
 
 @router.get("/test")
@@ -1,5 +1,7 @@
 """ChromaDB client for persistent vector storage"""
 
+import os
+import threading
 from pathlib import Path
 from typing import Optional
 
@@ -82,6 +84,7 @@ class ChromaClient:
 
 # Cache of client instances per directory
 _chroma_clients: dict[str, ChromaClient] = {}
+_chroma_clients_lock = threading.Lock()
 
 
 def get_chroma_client(persist_directory: str = "./data/usa/chroma") -> ChromaClient:
@@ -95,8 +98,14 @@ def get_chroma_client(persist_directory: str = "./data/usa/chroma") -> ChromaCli
     Returns:
         ChromaClient instance
     """
-    global _chroma_clients
-    if persist_directory not in _chroma_clients:
-        _chroma_clients[persist_directory] = ChromaClient(persist_directory=persist_directory)
-    return _chroma_clients[persist_directory]
-
+    # Spellings of the same directory share one client (and one sqlite handle)
+    key = os.path.abspath(persist_directory)
+
+    client = _chroma_clients.get(key)
+    if client is None:
+        # Double-checked so concurrent first calls open the store only once
+        with _chroma_clients_lock:
+            client = _chroma_clients.get(key)
+            if client is None:
+                client = _chroma_clients[key] = ChromaClient(persist_directory=persist_directory)
+    return client
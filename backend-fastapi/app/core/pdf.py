@@ -0,0 +1,165 @@
+"""PDF text extraction parallelized across worker processes"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from pypdf import PdfReader
+
+# Malformed PDFs are common; don't spend time printing MuPDF's recoverable errors
+fitz.TOOLS.mupdf_display_errors(False)
+
+# PyMuPDF's default "text" flags (whitespace and ligatures preserved), so the
+# output keeps the original layout; pages are only concatenated, so the
+# reading-order sort is skipped
+_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT
+
+# Workers are spawned (not forked) so they don't inherit the server's threads;
+# this module stays light so spawning it is cheap
+PDF_WORKERS = os.cpu_count() or 1
+
+# Below this many pages per task, process overhead outweighs the parallelism
+MIN_PAGES_PER_TASK = 8
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared PDF extraction process pool (created on first use)"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def warm_up_process_pool():
+    """
+    Spawn the PDF extraction workers ahead of traffic (called at app startup)
+
+    ProcessPoolExecutor only starts workers as tasks are submitted, so one
+    no-op task per worker is run to pay the spawn and import cost up front.
+    """
+    pool = get_process_pool()
+    futures = [pool.submit(os.getpid) for _ in range(PDF_WORKERS)]
+    for future in futures:
+        future.result()
+
+
+def shutdown_process_pool():
+    """Shut down the PDF extraction process pool (called on application shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+def _page_ranges(num_pages: int) -> List[Tuple[int, int]]:
+    """Split pages into [start, end) ranges, one task each, at least MIN_PAGES_PER_TASK long"""
+    pages_per_task = max(MIN_PAGES_PER_TASK, math.ceil(num_pages / PDF_WORKERS))
+    return [
+        (start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """
+    Extract layout-preserving text from pages [start, end)
+
+    Args:
+        pdf_path: Path to PDF file
+        start: First page index
+        end: Page index to stop before
+
+    Returns:
+        Text of each non-empty page, in page order
+    """
+    with fitz.open(pdf_path) as doc:
+        texts = (doc[i].get_text("text", sort=False, flags=_TEXT_FLAGS) for i in range(start, end))
+        return [text for text in texts if text.strip()]
+
+
+async def pdf_to_markdown(pdf_path: str) -> str:
+    """
+    Convert PDF to plain text preserving original formatting
+
+    Page ranges are extracted in parallel worker processes and stitched
+    back together in order.
+
+    Args:
+        pdf_path: Path to PDF file
+
+    Returns:
+        Plain text with preserved line breaks
+    """
+    with fitz.open(pdf_path) as doc:
+        num_pages = doc.page_count
+
+    ranges = _page_ranges(num_pages)
+
+    if len(ranges) <= 1:
+        # Small document - not worth a round trip to the pool
+        parts = [await asyncio.to_thread(extract_page_range, pdf_path, 0, num_pages)]
+    else:
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, extract_page_range, pdf_path, start, end)
+            for start, end in ranges
+        ))
+
+    # Join all pages
+    return "\n".join(text for part in parts for text in part)
+
+
+def extract_pypdf_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """
+    Extract pypdf text from pages [start, end)
+
+    Args:
+        pdf_path: Path to PDF file
+        start: First page index
+        end: Page index to stop before
+
+    Returns:
+        Text of each non-empty page, in page order
+    """
+    reader = PdfReader(pdf_path)
+    texts = (reader.pages[i].extract_text() for i in range(start, end))
+    return [text for text in texts if text]
+
+
+def extract_pypdf_pages(pdf_path: str) -> List[str]:
+    """
+    Extract pypdf text of every non-empty page, page ranges in parallel
+
+    pypdf's extraction is pure Python, so ranges run in the worker processes,
+    each reopening the file by path (blocking; call from a thread when on the
+    event loop). The page count comes from MuPDF, which only reads the page
+    tree instead of parsing the whole document.
+
+    Args:
+        pdf_path: Path to PDF file
+
+    Returns:
+        Text of each non-empty page, in page order
+    """
+    with fitz.open(pdf_path) as doc:
+        num_pages = doc.page_count
+
+    ranges = _page_ranges(num_pages)
+    if len(ranges) <= 1:
+        # Small document - not worth a round trip to the pool
+        return extract_pypdf_page_range(pdf_path, 0, num_pages)
+
+    starts, ends = zip(*ranges)
+    parts = get_process_pool().map(extract_pypdf_page_range, repeat(pdf_path), starts, ends)
+    return [text for part in parts for text in part]
@@ -1,14 +1,217 @@
 """Build and manage knowledge graphs for regulations"""
 
-import json
+import os
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import networkx as nx
 import numpy as np
+import orjson
+import scipy.sparse as sp
+
+try:
+    import cupy as cp
+    import cupyx.scipy.sparse as cpsp
+    if cp.cuda.runtime.getDeviceCount() == 0:
+        cp = None
+except Exception:  # Optional: not installed, or no usable CUDA device/driver
+    cp = None
+
+try:
+    import faiss
+except ImportError:  # Optional: exact search with SimSIMD/NumPy is used instead
+    faiss = None
+
+try:
+    import simsimd
+except ImportError:  # Optional: a NumPy matmul computes the similarity matrix instead
+    simsimd = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # Optional: NumPy argpartition selects the top k instead
+    njit = None
 
 from app.models.regulation import RegulationClause, RegulationTriplet
 
+# Above this many clauses, FAISS switches to an approximate HNSW index
+HNSW_MIN_NODES = 50_000
+
+# Rows of the similarity matrix computed at a time: peak memory is
+# O(block x N) instead of O(N^2), and each block is reduced to its top k
+# before the next is built
+SIMILARITY_BLOCK_ROWS = 1024
+
+# From this many nodes, PPR runs on the GPU (below it, kernel launch and
+# transfer overhead outweigh the faster sparse mat-vec)
+GPU_PPR_MIN_NODES = 20_000
+
+# Suffix of the embedding row-id sidecar written next to each graph .json
+# (graph discovery must skip it)
+EMBEDDING_IDS_SUFFIX = ".embedding_ids.json"
+
+# Keys of the embedding matrix and its row ids in legacy .embeddings.npz files
+# (older still store one array per node id instead)
+_EMBEDDING_IDS_KEY = "__ids__"
+_EMBEDDING_MATRIX_KEY = "__matrix__"
+
+
+# Compiled by warm_up_kernels at app startup (cache=True reuses the machine
+# code across processes and restarts), not at import: spawned PDF workers
+# import this module too and never use it
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _top_k_rows(similarity_matrix, k):
+        """Top k (similarity, column) per row, rows in parallel, one pass over each row"""
+        n, m = similarity_matrix.shape
+        similarities = np.empty((n, k), dtype=similarity_matrix.dtype)
+        indices = np.empty((n, k), dtype=np.int64)
+        for i in prange(n):
+            row = similarity_matrix[i]
+            # Insertion into a sorted buffer of k: cheap for the small k used here
+            size = 0
+            for j in range(m):
+                value = row[j]
+                if size == k and value <= similarities[i, k - 1]:
+                    continue
+                pos = size if size < k else k - 1
+                while pos > 0 and similarities[i, pos - 1] < value:
+                    if pos < k:
+                        similarities[i, pos] = similarities[i, pos - 1]
+                        indices[i, pos] = indices[i, pos - 1]
+                    pos -= 1
+                similarities[i, pos] = value
+                indices[i, pos] = j
+                if size < k:
+                    size += 1
+        return similarities, indices
+else:
+    _top_k_rows = None
+
+
+def warm_up_kernels():
+    """
+    Compile (or load from Numba's on-disk cache) the JIT kernels ahead of
+    traffic, so the first ingest does not stall the event loop on compilation
+    (called at app startup, from a thread)
+    """
+    if _top_k_rows is not None:
+        _top_k_rows(np.zeros((2, 2), dtype=np.float32), 1)
+        _top_k_rows(np.zeros((2, 2), dtype=np.float64), 1)
+
+
+def _replace_file(path: Path, write) -> None:
+    """
+    Write a file via a temporary sibling and an atomic rename
+    
+    A memory-mapped copy of the old file (see RegulationGraphBuilder.load)
+    keeps its inode, so it is never truncated underneath the reader.
+    
+    Args:
+        path: Destination file
+        write: Callable writing the contents to a binary file object
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length as a new float32 matrix (zero rows stay zero)"""
+    emb = np.array(embeddings, dtype=np.float32, order="C")
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    emb /= norms
+    return emb
+
+
+def _nearest_neighbors(normalized: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-(k + 1) cosine neighbors of every embedding (the +1 leaves room for itself)
+    
+    Computes similarities and top-k selection on the GPU with CuPy when a
+    CUDA device is available; otherwise uses FAISS when installed, or falls
+    back to SimSIMD's int8 dot-product kernels or a plain NumPy matmul. The
+    dense paths work through SIMILARITY_BLOCK_ROWS rows at a time, so the
+    full N x N matrix is never held. Rows are unit length, so cosine is the
+    dot product.
+    
+    Args:
+        normalized: (N, D) L2-normalized float32 embedding matrix
+        k: Neighbors wanted per row, excluding the row itself
+        
+    Returns:
+        (similarities, indices), both (N, min(k + 1, N)), best first
+    """
+    n = normalized.shape[0]
+    k = min(k + 1, n)
+    
+    # FAISS is preferred over the GPU only where its approximate index applies
+    if faiss is not None and (cp is None or n > HNSW_MIN_NODES):
+        if n > HNSW_MIN_NODES:
+            index = faiss.IndexHNSWFlat(normalized.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = 64
+        else:
+            index = faiss.IndexFlatIP(normalized.shape[1])
+        index.add(normalized)
+        return index.search(normalized, k)
+    
+    similarities = np.empty((n, k), dtype=np.float32)
+    indices = np.empty((n, k), dtype=np.int64)
+    
+    if cp is not None:
+        # Only each block's (B, k) selection is copied back to the host
+        device_embeddings = cp.asarray(normalized)
+        for start in range(0, n, SIMILARITY_BLOCK_ROWS):
+            block = slice(start, start + SIMILARITY_BLOCK_ROWS)
+            device_similarity = device_embeddings[block] @ device_embeddings.T
+            if k < n:
+                device_indices = cp.argpartition(-device_similarity, k - 1, axis=1)[:, :k]
+            else:
+                device_indices = cp.broadcast_to(cp.arange(n), device_similarity.shape)
+            similarities[block] = cp.take_along_axis(device_similarity, device_indices, axis=1).get()
+            indices[block] = device_indices.get()
+        return _sort_neighbors(similarities, indices)
+    
+    if simsimd is not None:
+        # Rank on int8 codes: unit-length components lie in [-1, 1], so scaling
+        # by 127 uses the full int8 range and ranking recall is unaffected
+        quantized = np.rint(normalized * 127).astype(np.int8)
+    
+    for start in range(0, n, SIMILARITY_BLOCK_ROWS):
+        block = slice(start, start + SIMILARITY_BLOCK_ROWS)
+        if simsimd is not None:
+            similarity_block = np.asarray(simsimd.cdist(quantized[block], quantized, metric="dot"))
+        else:
+            similarity_block = normalized[block] @ normalized.T
+        
+        # Select the top k per row in O(N), then sort only those k columns
+        if _top_k_rows is not None:
+            block_similarities, block_indices = _top_k_rows(similarity_block, k)
+        else:
+            if k < n:
+                block_indices = np.argpartition(-similarity_block, k - 1, axis=1)[:, :k]
+            else:
+                block_indices = np.broadcast_to(np.arange(n), similarity_block.shape)
+            block_similarities = np.take_along_axis(similarity_block, block_indices, axis=1)
+        
+        if simsimd is not None:
+            # Edge confidences come from the float32 rows, not the int8 scores
+            block_similarities = np.einsum(
+                "nd,nkd->nk", normalized[block], normalized[block_indices]
+            )
+        similarities[block] = block_similarities
+        indices[block] = block_indices
+    
+    return _sort_neighbors(similarities, indices)
+
+
+def _sort_neighbors(similarities: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Order each row's selected neighbors best first"""
+    order = np.argsort(-similarities, axis=1, kind="stable")
+    return np.take_along_axis(similarities, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
 
 class RegulationGraphBuilder:
     """Build knowledge graph from regulations"""
@@ -16,7 +219,133 @@ class RegulationGraphBuilder:
     def __init__(self):
         """Initialize graph builder"""
         self.graph = nx.DiGraph()
-        self.node_embeddings: Dict[str, np.ndarray] = {}
+        
+        # Clause embeddings as one contiguous float32 matrix (rows beyond
+        # _embedding_count are spare capacity) plus a node id -> row index
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._embedding_count = 0
+        self._embedding_rows: Dict[str, int] = {}
+        self._normalized_embeddings: Optional[np.ndarray] = None
+        
+        # PPR transition matrix (transposed, CSR) and out-weight derived data,
+        # built lazily and dropped whenever the graph changes
+        self._node_list: Optional[List[str]] = None
+        self._node_index: Dict[str, int] = {}
+        self._transition: Optional[sp.csr_array] = None
+        self._dangling: Optional[np.ndarray] = None
+        self._stats: Optional[Dict] = None
+        
+        # Device copies of the transition matrix and dangling indices (CuPy)
+        self._device_transition: Optional[Tuple] = None
+        
+        # relation -> node -> successors over that relation, built lazily
+        self._relation_successors: Optional[Dict[str, Dict[str, List[str]]]] = None
+    
+    @property
+    def embedding_matrix(self) -> np.ndarray:
+        """(N, D) float32 view of the stored embeddings, in insertion order"""
+        return self._embeddings[:self._embedding_count]
+    
+    @property
+    def normalized_embedding_matrix(self) -> np.ndarray:
+        """L2-normalized embedding_matrix, computed once per change to the embeddings"""
+        if self._normalized_embeddings is None:
+            self._normalized_embeddings = _l2_normalize(self.embedding_matrix)
+        return self._normalized_embeddings
+    
+    def get_embedding(self, node_id: str) -> Optional[np.ndarray]:
+        """Embedding of a node, or None if it has none"""
+        row = self._embedding_rows.get(node_id)
+        return None if row is None else self._embeddings[row]
+    
+    def _set_embeddings(self, node_ids: List[str], embeddings: List[List[float]]):
+        """Store (or overwrite) many embeddings with one matrix write, growing capacity at most once"""
+        if not node_ids:
+            return
+        
+        dim = len(embeddings[0])
+        if self._embedding_count and self._embeddings.shape[1] != dim:
+            # Saved by another embedding model (EMBEDDER_BACKEND changed): the
+            # vectors are not comparable, so drop them instead of mixing
+            print(
+                f"Embedding dimension changed ({self._embeddings.shape[1]} -> {dim}); "
+                "discarding stored clause embeddings - re-ingest to restore them"
+            )
+            self._embeddings = np.empty((0, dim), dtype=np.float32)
+            self._embedding_rows = {}
+            self._embedding_count = 0
+        
+        rows = np.empty(len(node_ids), dtype=np.intp)
+        count = self._embedding_count
+        for i, node_id in enumerate(node_ids):
+            row = self._embedding_rows.get(node_id)
+            if row is None:
+                row = self._embedding_rows[node_id] = count
+                count += 1
+            rows[i] = row
+        
+        # Grow geometrically so repeated small batches stay amortized O(1)
+        capacity = self._embeddings.shape[0]
+        if count > capacity:
+            grown = np.empty((max(64, 2 * capacity, count), dim), dtype=np.float32)
+            if self._embedding_count:
+                grown[:self._embedding_count] = self._embeddings[:self._embedding_count]
+            self._embeddings = grown
+        
+        self._embeddings[rows] = np.asarray(embeddings, dtype=np.float32)
+        self._embedding_count = count
+        self._normalized_embeddings = None
+    
+    def _invalidate(self):
+        """Drop structures derived from the graph (call after any mutation)"""
+        self._node_list = None
+        self._node_index = {}
+        self._transition = None
+        self._dangling = None
+        self._stats = None
+        self._relation_successors = None
+        self._device_transition = None
+    
+    def _transition_matrix(self) -> Tuple[List[str], sp.csr_array, np.ndarray]:
+        """
+        Get the PPR transition matrix, building it on first use after a change
+        
+        Returns:
+            (node list, transpose of the row-normalized confidence-weighted
+            adjacency as CSR, indices of dangling nodes with no out-weight)
+        """
+        if self._node_list is None:
+            node_list = list(self.graph)
+            A = nx.to_scipy_sparse_array(
+                self.graph, nodelist=node_list, weight='confidence', dtype=float, format='csr'
+            )
+            # Out-weights are computed once per graph version, not per call
+            out_weight = A.sum(axis=1)
+            scale = np.zeros_like(out_weight)
+            np.divide(1.0, out_weight, out=scale, where=out_weight != 0)
+            
+            # Stored transposed so each iteration is a plain CSR mat-vec
+            self._transition = sp.csr_array((sp.diags_array(scale) @ A).T)
+            self._dangling = np.flatnonzero(out_weight == 0)
+            self._node_index = {node: i for i, node in enumerate(node_list)}
+            self._node_list = node_list
+        return self._node_list, self._transition, self._dangling
+    
+    def _device_transition_matrix(self) -> Tuple:
+        """
+        Get the PPR transition matrix on the GPU, copied once per graph version
+        
+        Returns:
+            (transposed transition matrix as CuPy CSR, dangling node indices)
+        """
+        if self._device_transition is None:
+            _, transition, dangling = self._transition_matrix()
+            device_transition = cpsp.csr_matrix(
+                (cp.asarray(transition.data), cp.asarray(transition.indices), cp.asarray(transition.indptr)),
+                shape=transition.shape,
+            )
+            self._device_transition = (device_transition, cp.asarray(dangling))
+        return self._device_transition
     
     def add_clause_node(self, clause: RegulationClause):
         """
@@ -25,19 +354,36 @@ class RegulationGraphBuilder:
         Args:
             clause: RegulationClause object
         """
-        self.graph.add_node(
-            clause.id,
-            type="clause",
-            text=clause.text,
-            section=clause.section,
-            clause_number=clause.clause_number,
-            requirement_type=clause.requirement_type,
-            severity=clause.severity,
-        )
+        self.add_clause_nodes((clause,))
+    
+    def add_clause_nodes(self, clauses: Iterable[RegulationClause]):
+        """
+        Add many regulation clauses as nodes in one call
         
-        # Store embedding if available
-        if clause.embedding:
-            self.node_embeddings[clause.id] = np.array(clause.embedding)
+        Args:
+            clauses: RegulationClause objects
+        """
+        nodes = []
+        embedded_ids = []
+        embeddings = []
+        for clause in clauses:
+            nodes.append((clause.id, {
+                "type": "clause",
+                "text": clause.text,
+                "section": clause.section,
+                "clause_number": clause.clause_number,
+                "requirement_type": clause.requirement_type,
+                "severity": clause.severity,
+            }))
+            
+            # Store embedding if available
+            if clause.embedding:
+                embedded_ids.append(clause.id)
+                embeddings.append(clause.embedding)
+        
+        self.graph.add_nodes_from(nodes)
+        self._set_embeddings(embedded_ids, embeddings)
+        self._invalidate()
     
     def add_triplet(self, triplet: RegulationTriplet):
         """
@@ -46,21 +392,63 @@ class RegulationGraphBuilder:
         Args:
             triplet: RegulationTriplet object
         """
-        # Ensure both nodes exist
-        if not self.graph.has_node(triplet.subject):
-            self.graph.add_node(triplet.subject, type="unknown")
-        if not self.graph.has_node(triplet.object):
-            self.graph.add_node(triplet.object, type="unknown")
-        
-        # Add edge with relationship
-        self.graph.add_edge(
-            triplet.subject,
-            triplet.object,
-            relation=triplet.predicate,
-            confidence=triplet.confidence,
-            source=triplet.source,
+        self.add_triplets((triplet,))
+    
+    def add_triplets(self, triplets: Iterable[RegulationTriplet], confidence: Optional[float] = None):
+        """
+        Add many triplets in one call
+        
+        Args:
+            triplets: RegulationTriplet objects
+            confidence: Edge weight to use instead of each triplet's own
+                confidence (the triplets are not modified)
+        """
+        self._add_edges(
+            (
+                triplet.subject,
+                triplet.object,
+                triplet.predicate,
+                triplet.confidence if confidence is None else confidence,
+                triplet.source,
+            )
+            for triplet in triplets
         )
     
+    def _add_edges(
+        self,
+        edges: Iterable[Tuple[str, str, str, float, Optional[str]]],
+        endpoints_exist: bool = False,
+    ):
+        """
+        Add (subject, object, predicate, confidence, source) edges in bulk
+        
+        Same result as add_triplet per edge, without building a triplet
+        model for each one.
+        
+        Args:
+            edges: Edge tuples
+            endpoints_exist: Caller guarantees every endpoint is already a
+                node, so the per-edge membership checks are skipped
+        """
+        graph = self.graph
+        edge_list = []
+        for subject, obj, predicate, confidence, source in edges:
+            # Ensure both nodes exist
+            if not endpoints_exist:
+                if subject not in graph:
+                    graph.add_node(subject, type="unknown")
+                if obj not in graph:
+                    graph.add_node(obj, type="unknown")
+            edge_list.append((subject, obj, {
+                "relation": predicate,
+                "confidence": confidence,
+                "source": source,
+            }))
+        
+        # Add edges with relationships
+        graph.add_edges_from(edge_list)
+        self._invalidate()
+    
     def add_nearby_chunk_edges(self, clauses: List[RegulationClause]):
         """
         Connect each requirement to its immediate neighbors (+1 and -1)
@@ -69,15 +457,11 @@ class RegulationGraphBuilder:
         Args:
             clauses: List of RegulationClause objects (in order)
         """
-        for i, clause in enumerate(clauses):
-            # Connect to next requirement only
-            if i < len(clauses) - 1:
-                self.add_triplet(RegulationTriplet(
-                    subject=clause.id,
-                    predicate="NEARBY",
-                    object=clauses[i + 1].id,
-                    confidence=1.0,
-                ))
+        # Connect to next requirement only
+        self._add_edges(
+            (clause.id, next_clause.id, "NEARBY", 1.0, None)
+            for clause, next_clause in zip(clauses, clauses[1:])
+        )
     
     def add_semantic_similarity_edges(
         self,
@@ -98,41 +482,40 @@ class RegulationGraphBuilder:
             max_edges_per_node: Max similar clauses to connect (default: 5)
             edge_weight: Weight for PPR (default: 0.1 = low priority)
         """
-        import numpy as np
-        from sklearn.metrics.pairwise import cosine_similarity
-        
-        # Get embeddings
-        embeddings = []
+        # Get embedding rows
+        rows = []
         clause_ids = []
         for clause in clauses:
-            if clause.id in self.node_embeddings:
-                embeddings.append(self.node_embeddings[clause.id])
+            row = self._embedding_rows.get(clause.id)
+            if row is not None:
+                rows.append(row)
                 clause_ids.append(clause.id)
         
-        if len(embeddings) < 2:
+        if len(rows) < 2:
             return
         
-        # Compute similarity matrix
-        embeddings_array = np.array(embeddings)
-        similarity_matrix = cosine_similarity(embeddings_array)
+        # Find top-K most similar clauses for every clause at once (one
+        # gather from the cached normalized matrix, no per-clause stacking)
+        embeddings_array = self.normalized_embedding_matrix[rows]
+        similarities, neighbors = _nearest_neighbors(embeddings_array, max_edges_per_node)
         
-        # Add edges for similar clauses
+        # Collect edges for similar clauses, then add them in one call
+        edges = []
         for i, clause_id in enumerate(clause_ids):
-            # Get similarities for this clause
-            similarities = similarity_matrix[i]
-            
-            # Find top-K most similar (excluding self)
-            similar_indices = np.argsort(similarities)[::-1][1:max_edges_per_node + 1]
+            # Drop the self match (usually, but not always, ranked first)
+            row = [
+                (j, sim_score)
+                for j, sim_score in zip(neighbors[i].tolist(), similarities[i].tolist())
+                if j != i and j >= 0
+            ][:max_edges_per_node]
             
-            for j in similar_indices:
-                sim_score = similarities[j]
+            for j, sim_score in row:
                 if sim_score >= similarity_threshold:
-                    self.add_triplet(RegulationTriplet(
-                        subject=clause_id,
-                        predicate="SIMILAR_TO",
-                        object=clause_ids[j],
-                        confidence=edge_weight,  # Use low weight instead of sim_score
-                    ))
+                    # Use low weight instead of sim_score
+                    edges.append((clause_id, clause_ids[j], "SIMILAR_TO", edge_weight, None))
+        
+        # Endpoints all have stored embeddings, so they were added as clause nodes
+        self._add_edges(edges, endpoints_exist=True)
     
     def get_neighbors(self, node_id: str, relation: Optional[str] = None) -> List[str]:
         """
@@ -145,19 +528,21 @@ class RegulationGraphBuilder:
         Returns:
             List of neighbor node IDs
         """
-        if not self.graph.has_node(node_id):
+        if node_id not in self.graph:
             return []
         
-        neighbors = []
-        for neighbor in self.graph.successors(node_id):
-            if relation is None:
-                neighbors.append(neighbor)
-            else:
-                edge_data = self.graph[node_id][neighbor]
-                if edge_data.get("relation") == relation:
-                    neighbors.append(neighbor)
+        if relation is None:
+            return list(self.graph.successors(node_id))
+        
+        # Index every edge by relation once per graph version, so filtered
+        # lookups are dict hits instead of a scan over the node's edges
+        if self._relation_successors is None:
+            index: Dict[str, Dict[str, List[str]]] = {}
+            for source, target, edge_relation in self.graph.edges(data="relation"):
+                index.setdefault(edge_relation, {}).setdefault(source, []).append(target)
+            self._relation_successors = index
         
-        return neighbors
+        return list(self._relation_successors.get(relation, {}).get(node_id, ()))
     
     def personalized_pagerank(
         self,
@@ -196,28 +581,52 @@ class RegulationGraphBuilder:
         if len(valid_seeds) < len(seed_nodes):
             print(f"PPR warning: Only {len(valid_seeds)}/{len(seed_nodes)} seeds found in graph")
         
-        # Create personalization vector (uniform over valid seeds)
-        personalization = {node: 0.0 for node in self.graph.nodes()}
-        for seed in valid_seeds:
-            personalization[seed] = 1.0 / len(valid_seeds)
+        # Without edges (or with a single node) every step returns all mass to
+        # the seeds, so the fixed point is the personalization vector itself
+        if self.graph.number_of_edges() == 0 or self.graph.number_of_nodes() == 1:
+            seeds = set(valid_seeds)
+            share = 1.0 / len(seeds)
+            return {node: share if node in seeds else 0.0 for node in self.graph}
         
         # Run PPR with edge weights
         # confidence = weight (LLM edges have confidence=1.0, semantic edges have confidence=0.1)
         try:
-            ppr_scores = nx.pagerank(
-                self.graph,
-                alpha=alpha,
-                personalization=personalization,
-                max_iter=max_iter,
-                tol=1e-6,
-                weight='confidence',  # Use edge confidence as weight (LLM=1.0 >> semantic=0.1)
-            )
-            print(f"PPR success: Computed scores for {len(ppr_scores)} nodes from {len(valid_seeds)} seeds (using edge weights)")
-            return ppr_scores
-        except nx.PowerIterationFailedConvergence as e:
-            print(f"PPR convergence failed after {max_iter} iterations, using partial results")
-            # Return the partial results from the exception
-            return e.pagerank
+            node_list, transition, dangling = self._transition_matrix()
+            
+            # Personalization vector (uniform over valid seeds); only the seed
+            # rows are written, duplicates in seed_nodes count once
+            seed_rows = np.unique([self._node_index[seed] for seed in valid_seeds])
+            personalization = np.zeros(len(node_list))
+            personalization[seed_rows] = 1.0 / len(seed_rows)
+            
+            n = len(node_list)
+            xp = np
+            if cp is not None and n >= GPU_PPR_MIN_NODES:
+                # Same iteration on the GPU, against a cached device copy
+                xp = cp
+                transition, dangling = self._device_transition_matrix()
+                personalization = cp.asarray(personalization)
+            
+            # Power iteration on the cached matrix (same update and stopping
+            # rule as nx.pagerank; dangling mass goes back to the seeds)
+            teleport = (1 - alpha) * personalization
+            x = xp.full(n, 1.0 / n)
+            converged = False
+            for _ in range(max_iter):
+                x_last = x
+                x = alpha * (transition @ x + x[dangling].sum() * personalization) + teleport
+                if float(xp.abs(x - x_last).sum()) < n * 1e-6:
+                    converged = True
+                    break
+            
+            if xp is not np:
+                x = cp.asnumpy(x)
+            if not converged:
+                print(f"PPR convergence failed after {max_iter} iterations, using partial results")
+                return dict(zip(node_list, x.tolist()))
+            
+            print(f"PPR success: Computed scores for {n} nodes from {len(valid_seeds)} seeds (using edge weights)")
+            return dict(zip(node_list, x.tolist()))
         except Exception as e:
             print(f"PPR failed with error: {type(e).__name__}: {e}")
             # Fallback: Return seed nodes with high scores, others with low scores
@@ -241,24 +650,32 @@ class RegulationGraphBuilder:
             return dict(self.graph.nodes[node_id])
         return None
     
-    def save(self, filepath: str):
+    def save(self, filepath: str, pretty: bool = False):
         """
         Save graph to file
         
         Args:
             filepath: Path to save graph
+            pretty: Indent the JSON for reading by hand (larger, slower)
         """
         filepath = Path(filepath)
         filepath.parent.mkdir(parents=True, exist_ok=True)
         
         # Save graph (explicitly set edges='links' to suppress NetworkX 3.6 warning)
         graph_data = nx.node_link_data(self.graph, edges='links')
-        with open(filepath, 'w') as f:
-            json.dump(graph_data, f, indent=2)
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        graph_bytes = orjson.dumps(graph_data, option=option)
+        _replace_file(filepath, lambda f: f.write(graph_bytes))
         
-        # Save embeddings separately
-        embedding_file = filepath.with_suffix('.embeddings.npz')
-        np.savez(embedding_file, **self.node_embeddings)
+        # Save embeddings separately: one raw .npy matrix (memory-mappable on
+        # load) plus its row ids
+        row_ids = sorted(self._embedding_rows, key=self._embedding_rows.get)
+        matrix = self.embedding_matrix
+        _replace_file(filepath.with_suffix('.embeddings.npy'), lambda f: np.save(f, matrix))
+        ids_bytes = orjson.dumps(row_ids)
+        _replace_file(filepath.with_suffix(EMBEDDING_IDS_SUFFIX), lambda f: f.write(ids_bytes))
     
     def load(self, filepath: str):
         """
@@ -270,28 +687,55 @@ class RegulationGraphBuilder:
         filepath = Path(filepath)
         
         # Load graph
-        with open(filepath, 'r') as f:
-            graph_data = json.load(f)
+        graph_data = orjson.loads(filepath.read_bytes())
         # Explicitly set edges='links' to suppress NetworkX 3.6 warning
         self.graph = nx.node_link_graph(graph_data, edges='links')
+        self._invalidate()
         
-        # Load embeddings
+        # Load embeddings, mapped copy-on-write so rows are only read from disk
+        # when touched (new rows are appended to an in-memory copy)
+        matrix_file = filepath.with_suffix('.embeddings.npy')
+        ids_file = filepath.with_suffix(EMBEDDING_IDS_SUFFIX)
         embedding_file = filepath.with_suffix('.embeddings.npz')
-        if embedding_file.exists():
-            embeddings_data = np.load(embedding_file)
-            self.node_embeddings = {
-                key: embeddings_data[key] 
-                for key in embeddings_data.files
-            }
+        if matrix_file.exists() and ids_file.exists():
+            row_ids = orjson.loads(ids_file.read_bytes())
+            self._embeddings = np.load(matrix_file, mmap_mode='c')
+            self._embedding_count = len(row_ids)
+            self._embedding_rows = {node_id: i for i, node_id in enumerate(row_ids)}
+            self._normalized_embeddings = None
+        elif embedding_file.exists():
+            with np.load(embedding_file) as embeddings_data:
+                if _EMBEDDING_MATRIX_KEY in embeddings_data.files:
+                    row_ids = embeddings_data[_EMBEDDING_IDS_KEY].tolist()
+                    matrix = embeddings_data[_EMBEDDING_MATRIX_KEY]
+                else:
+                    # Older format: one array per node id
+                    row_ids = embeddings_data.files
+                    matrix = (
+                        np.stack([embeddings_data[key] for key in row_ids])
+                        if row_ids else np.empty((0, 0))
+                    )
+            
+            self._embeddings = np.ascontiguousarray(matrix, dtype=np.float32)
+            self._embedding_count = len(row_ids)
+            self._embedding_rows = {node_id: i for i, node_id in enumerate(row_ids)}
+            self._normalized_embeddings = None
     
     def get_stats(self) -> Dict:
-        """Get graph statistics"""
-        return {
-            "num_nodes": self.graph.number_of_nodes(),
-            "num_edges": self.graph.number_of_edges(),
-            "node_types": self._count_node_types(),
-            "edge_types": self._count_edge_types(),
-        }
+        """Get graph statistics (computed once per graph version)"""
+        if self._stats is None:
+            self._stats = {
+                "num_nodes": self.graph.number_of_nodes(),
+                "num_edges": self.graph.number_of_edges(),
+                "node_types": self._count_node_types(),
+                "edge_types": self._count_edge_types(),
+            }
+        
+        # Copies, so callers can't modify the cached counts
+        stats = dict(self._stats)
+        stats["node_types"] = dict(stats["node_types"])
+        stats["edge_types"] = dict(stats["edge_types"])
+        return stats
     
     def _count_node_types(self) -> Dict[str, int]:
         """Count nodes by type"""
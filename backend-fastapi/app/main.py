@@ -1,10 +1,42 @@
 """Main FastAPI application entry point"""
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from app.api.routes import health
+from app.agents.lava_agent import close_http_client
+from app.api.routes import health, regulations
 from app.core.config import settings
+from app.core.pdf import shutdown_process_pool, warm_up_process_pool
+from app.graph.graph_builder import warm_up_kernels
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown"""
+    # Load embedding models and graphs, spawn the PDF extraction workers and
+    # compile the JIT kernels before serving traffic. Best-effort: anything that
+    # fails here is loaded on first use instead.
+    await asyncio.to_thread(regulations.warm_up_regulation_services, settings.WARMUP_COUNTRIES)
+    try:
+        await asyncio.to_thread(warm_up_process_pool)
+    except Exception:
+        logger.exception("PDF worker warmup failed")
+    try:
+        await asyncio.to_thread(warm_up_kernels)
+    except Exception:
+        logger.exception("JIT kernel warmup failed")
+    yield
+    # Close pooled LLM connections and worker processes on shutdown
+    await close_http_client()
+    shutdown_process_pool()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -13,6 +45,8 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -26,9 +60,6 @@ app.add_middleware(
 
 # Include routers
 app.include_router(health.router, prefix="/api", tags=["health"])
-
-# Import regulations router
-from app.api.routes import regulations
 app.include_router(regulations.router, prefix="/api/regulations", tags=["regulations"])
 
 
@@ -43,6 +74,8 @@ async def root():
 
 
 if __name__ == "__main__":
+    import sys
+
     import uvicorn
 
     uvicorn.run(
@@ -50,5 +83,8 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        # uvloop and httptools ship with uvicorn[standard] (no uvloop on Windows)
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
     )
 
@@ -1,5 +1,6 @@
 """Data models for regulations"""
 
+from dataclasses import dataclass
 from typing import List, Optional
 from pydantic import BaseModel
 
@@ -28,8 +29,15 @@ class RegulationDocument(BaseModel):
     clauses: List[RegulationClause] = []
 
 
-class RegulationTriplet(BaseModel):
-    """A knowledge graph triplet extracted from regulations"""
+@dataclass(slots=True)
+class RegulationTriplet:
+    """
+    A knowledge graph triplet extracted from regulations
+    
+    Only used internally between extraction and graph building (never
+    serialized by the API), so it is a slotted dataclass rather than a
+    validated model; callers convert the LLM's values themselves.
+    """
     
     subject: str  # Node ID
     predicate: str  # Relationship type
@@ -1,24 +1,55 @@
 """Service for handling regulation documents and compliance checking"""
 
 import asyncio
-import json
+import hashlib
 import re
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from pypdf import PdfReader
+import numpy as np
+import orjson
 from sentence_transformers import SentenceTransformer
 
+try:
+    from model2vec import StaticModel
+except ImportError:  # Optional: only needed for EMBEDDER_BACKEND="static"
+    StaticModel = None
+
 from app.agents import LavaAgent
 from app.agents.compliance_agent import ComplianceAgent
+from app.agents.reranker import get_default_reranker
+from app.agents.semantic_cache import SemanticCache
 from app.chroma import get_chroma_client
-from app.graph.graph_builder import RegulationGraphBuilder
+from app.core.config import settings
+from app.core.pdf import extract_pypdf_pages
+from app.graph.graph_builder import EMBEDDING_IDS_SUFFIX, RegulationGraphBuilder
 from app.models.regulation import (
     RegulationClause,
     RegulationDocument,
     RegulationTriplet,
 )
 
+# Retrieval results kept per service (LRU); cleared whenever regulations change,
+# and entries older than the TTL are recomputed
+RETRIEVAL_CACHE_SIZE = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 3600
+
+# Patterns for cleaning LLM JSON output and splitting text, compiled once
+_RE_JSON_FENCE = re.compile(r'```(?:json)?\s*')
+_RE_JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+_RE_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_RE_SENTENCE_SPLIT = re.compile(r'[.!?]\s+')
+
+# Clauses per ChromaDB add() call; bounds the memory and index work per write
+CHROMA_ADD_BATCH_SIZE = 1000
+
+# Clauses per embedder batch. encode() already sorts texts by length, so each
+# batch pads only to similar lengths; larger batches cut per-batch overhead
+EMBED_BATCH_SIZE = 256
+
 
 class RegulationService:
     """Service for processing MESSY, UNSTRUCTURED regulations and building knowledge graphs"""
@@ -31,8 +62,6 @@ class RegulationService:
             country: Country code (USA, JAPAN, EU, etc.) - determines storage paths
         """
         self.country = country.lower()
-        self.agent = LavaAgent()
-        self.compliance_agent = ComplianceAgent()
         
         # Set up country-specific paths
         self.data_dir = Path(f"./data/{self.country}")
@@ -49,11 +78,47 @@ class RegulationService:
         
         # Initialize embedding model (local, no API needed)
         print("Loading embedding model...")
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        print("Embedding model loaded")
+        if settings.EMBEDDER_BACKEND == "static":
+            # Token-embedding lookup + mean pool: no attention, runs fast on any CPU
+            if StaticModel is None:
+                raise ImportError('EMBEDDER_BACKEND="static" requires model2vec (poetry install -E static)')
+            embedder_name = settings.STATIC_EMBEDDING_MODEL
+            self.embedder = StaticModel.from_pretrained(embedder_name)
+            print(f"Embedding model loaded ({embedder_name})")
+        else:
+            embedder_name = 'all-MiniLM-L6-v2'
+            self.embedder = SentenceTransformer(embedder_name)
+            if self.embedder.device.type == "cuda":
+                # MiniLM inference is bandwidth-bound; half precision halves the
+                # bytes moved per layer with negligible cosine drift
+                self.embedder.half()
+            print(f"Embedding model loaded ({self.embedder.device.type})")
+        
+        embed_fn = lambda text: self.embedder.encode([text])[0]
+        
+        # LLM agent with a semantic response cache (shared with ViolationFixAgent)
+        self.agent = LavaAgent(response_cache=SemanticCache(embed_fn))
+        
+        # Compliance agent reuses the embedder for its (on-disk) semantic response
+        # cache and, if enabled, reranks retrieved regulations before calling the LLM.
+        # The cache holds model-specific vectors, so each embedder gets its own files.
+        self.compliance_agent = ComplianceAgent(
+            embed_fn=embed_fn,
+            reranker=get_default_reranker() if settings.RERANKER_ENABLED else None,
+            cache_path=str(self.data_dir / "cache" / f"compliance-{embedder_name.rsplit('/', 1)[-1]}"),
+        )
+        
+        # HippoRAG results by (country, top_k, query hash) -> (stored at, results)
+        self._retrieval_cache: OrderedDict = OrderedDict()
+        self._retrieval_cache_lock = threading.Lock()
+        self._retrieval_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
         
         # Load existing graph if available (try to find any graph in the country directory)
-        existing_graphs = list(self.graph_dir.glob("*.json"))
+        # (skipping the embedding id sidecars saved alongside each graph)
+        existing_graphs = [
+            path for path in self.graph_dir.glob("*.json")
+            if not path.name.endswith(EMBEDDING_IDS_SUFFIX)
+        ]
         if existing_graphs:
             # Load the first graph found (you can modify this logic)
             graph_path = existing_graphs[0]
@@ -82,11 +147,10 @@ class RegulationService:
             Parsed JSON array or None if parsing fails
         """
         # Remove markdown code blocks
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*', '', response_text)
+        response_text = _RE_JSON_FENCE.sub('', response_text)
         
         # Try to extract JSON array using regex
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+        json_match = _RE_JSON_ARRAY.search(response_text)
         if json_match:
             json_str = json_match.group()
         else:
@@ -100,15 +164,15 @@ class RegulationService:
         strategies = [
             lambda s: s,  # Try as-is first
             lambda s: s.replace('\n', ' '),  # Remove newlines
-            lambda s: re.sub(r',\s*([}\]])', r'\1', s),  # Remove trailing commas
+            lambda s: _RE_TRAILING_COMMA.sub(r'\1', s),  # Remove trailing commas
             lambda s: s.replace('\\"', '"').replace('"', '\\"').replace('\\"', '"', 1),  # Fix quote escaping (basic)
         ]
         
         for i, clean_fn in enumerate(strategies):
             try:
                 cleaned = clean_fn(json_str)
-                return json.loads(cleaned)
-            except json.JSONDecodeError as e:
+                return orjson.loads(cleaned)
+            except orjson.JSONDecodeError as e:
                 if i == len(strategies) - 1:
                     # Last strategy failed, give up
                     print(f"    JSON parse error after all strategies: {str(e)[:100]}")
@@ -128,13 +192,20 @@ class RegulationService:
         Returns:
             Extracted text
         """
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:  # Skip empty pages
-                text += page_text + "\n"
-        return text
+        return "".join(page_text + "\n" for page_text in self.extract_pages_from_pdf(pdf_path))
+    
+    def extract_pages_from_pdf(self, pdf_path: str) -> List[str]:
+        """
+        Extract text per page from PDF file, skipping empty pages
+        
+        Args:
+            pdf_path: Path to PDF file (page ranges are extracted in parallel
+                worker processes)
+            
+        Returns:
+            Text of each non-empty page, in page order
+        """
+        return extract_pypdf_pages(pdf_path)
     
     def _chunk_text(self, text: str, chunk_size: int) -> List[str]:
         """
@@ -149,8 +220,7 @@ class RegulationService:
         
         # If still minimal splits, try sentences
         if len(paragraphs) <= 5:
-            import re
-            paragraphs = [s.strip() for s in re.split(r'[.!?]\s+', text) if s.strip()]
+            paragraphs = [s.strip() for s in _RE_SENTENCE_SPLIT.split(text) if s.strip()]
         
         chunks = []
         current_chunk = ""
@@ -395,13 +465,13 @@ class RegulationService:
             for triplet_data in triplets_data:
                 try:
                     triplet = RegulationTriplet(
-                        subject=triplet_data['subject'],
-                        predicate=triplet_data['predicate'],
-                        object=triplet_data['object'],
-                        confidence=triplet_data.get('confidence', 0.8),
+                        subject=str(triplet_data['subject']),
+                        predicate=str(triplet_data['predicate']),
+                        object=str(triplet_data['object']),
+                        confidence=float(triplet_data.get('confidence', 0.8)),
                     )
                     batch_triplets.append(triplet)
-                except (KeyError, TypeError) as e:
+                except (KeyError, TypeError, ValueError) as e:
                     print(f"    ⚠️  Skipping malformed triplet in batch {batch_num}: {e}")
                     continue
             return batch_triplets
@@ -468,10 +538,16 @@ class RegulationService:
             Clauses with embeddings added
         """
         texts = [clause.text for clause in clauses]
-        embeddings = self.embedder.encode(texts, show_progress_bar=True)
+        # Only arguments both embedder backends accept (both return NumPy)
+        embeddings = self.embedder.encode(
+            texts,
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=True,
+        )
         
-        for clause, embedding in zip(clauses, embeddings):
-            clause.embedding = embedding.tolist()
+        # One conversion for the whole matrix instead of one per row
+        for clause, embedding in zip(clauses, embeddings.tolist()):
+            clause.embedding = embedding
         
         return clauses
     
@@ -500,12 +576,17 @@ class RegulationService:
                 "severity": clause.severity or "",
             })
         
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-        )
+        # One float32 matrix instead of nested float lists marshalled per call
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        
+        for start in range(0, len(ids), CHROMA_ADD_BATCH_SIZE):
+            end = start + CHROMA_ADD_BATCH_SIZE
+            self.collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+            )
     
     def build_knowledge_graph(
         self,
@@ -522,15 +603,11 @@ class RegulationService:
             triplets: List of extracted triplets from agent
         """
         # Add clause nodes
-        for clause in regulation_doc.clauses:
-            self.graph_builder.add_clause_node(clause)
+        self.graph_builder.add_clause_nodes(regulation_doc.clauses)
         
         # Edge Type 1: LLM-based semantic relationships (HIGH WEIGHT)
         # These are high-quality, contextual relationships identified by the LLM
-        for triplet in triplets:
-            # Mark as high weight for PPR
-            triplet.confidence = 1.0  # High weight
-            self.graph_builder.add_triplet(triplet)
+        self.graph_builder.add_triplets(triplets, confidence=1.0)  # High weight for PPR
         
         # Edge Type 2: Semantic similarity edges (LOW WEIGHT)
         # Sparse backup connections based on embeddings
@@ -566,7 +643,7 @@ class RegulationService:
         
         # Step 1: Extract text from PDF
         print("Step 1: Extracting text from PDF...")
-        text = self.extract_text_from_pdf(pdf_path)
+        text = await asyncio.to_thread(self.extract_text_from_pdf, pdf_path)
         print(f"Extracted {len(text)} characters")
         
         # Step 2: Parse with agent (handles messy text)
@@ -593,6 +670,7 @@ class RegulationService:
         print("Step 4: Storing in ChromaDB...")
         self.store_in_chromadb(reg_doc)
         print("Stored in vector database")
+        self.clear_retrieval_cache()
         
         # Step 6: Extract semantic triplets
         print("Step 5: Extracting semantic relationships with agent...")
@@ -602,6 +680,8 @@ class RegulationService:
         # Step 7: Build knowledge graph
         print("Step 6: Building knowledge graph...")
         self.build_knowledge_graph(reg_doc, triplets)
+        self.clear_retrieval_cache()
+        self.compliance_agent.clear_cache()
         graph_stats = self.graph_builder.get_stats()
         print(f"Graph built: {graph_stats}")
         
@@ -632,6 +712,54 @@ class RegulationService:
         Returns:
             List of relevant regulation clauses with scores
         """
+        # Chunks of one document often repeat the same query text; the embedder
+        # is uncased and ignores whitespace, so normalize before hashing
+        normalized = " ".join(query_text.split()).lower()
+        cache_key = (country, top_k, hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest())
+        with self._retrieval_cache_lock:
+            entry = self._retrieval_cache.get(cache_key)
+            if entry is not None:
+                stored_at, cached = entry
+                if time.monotonic() - stored_at < RETRIEVAL_CACHE_TTL_SECONDS:
+                    self._retrieval_cache.move_to_end(cache_key)
+                    self._retrieval_cache_stats["hits"] += 1
+                    return [dict(result) for result in cached]
+                del self._retrieval_cache[cache_key]
+                self._retrieval_cache_stats["evictions"] += 1
+            self._retrieval_cache_stats["misses"] += 1
+        
+        results = self._retrieve_with_hipporag_uncached(query_text, country, top_k)
+        
+        with self._retrieval_cache_lock:
+            self._retrieval_cache[cache_key] = (time.monotonic(), [dict(result) for result in results])
+            self._retrieval_cache.move_to_end(cache_key)
+            if len(self._retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                self._retrieval_cache.popitem(last=False)
+                self._retrieval_cache_stats["evictions"] += 1
+        return results
+    
+    def clear_retrieval_cache(self):
+        """Drop cached retrieval results (after the graph or vector store changes)"""
+        with self._retrieval_cache_lock:
+            self._retrieval_cache.clear()
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        Get retrieval cache counters
+        
+        Returns:
+            Dict with hits, misses, evictions (LRU or expired) and current size
+        """
+        with self._retrieval_cache_lock:
+            return {**self._retrieval_cache_stats, "size": len(self._retrieval_cache)}
+    
+    def _retrieve_with_hipporag_uncached(
+        self,
+        query_text: str,
+        country: str,
+        top_k: int
+    ) -> List[Dict]:
+        """Run vector search + Personalized PageRank (see retrieve_with_hipporag)"""
         # Step 1: Vector search for seeds
         query_embedding = self.embedder.encode([query_text])[0]
         
@@ -725,8 +853,9 @@ class RegulationService:
         Returns:
             Compliance analysis with detailed results
         """
-        # Step 1: Find relevant regulations using HippoRAG
-        relevant_regs = self.retrieve_with_hipporag(
+        # Step 1: Find relevant regulations using HippoRAG (off the event loop)
+        relevant_regs = await asyncio.to_thread(
+            self.retrieve_with_hipporag,
             query_text=protocol_paragraph,
             country=country,
             top_k=top_k
@@ -746,3 +875,72 @@ class RegulationService:
         )
         
         return compliance_result
+    
+    async def check_protocols_batch(
+        self,
+        protocol_paragraphs: List[str],
+        country: str,
+        top_k: int = 10,
+        group_size: int = 4
+    ) -> List[Dict]:
+        """
+        Check many protocol paragraphs, grouping several into each LLM call
+        
+        Retrieval still runs per paragraph (concurrently); the compliance agent
+        then sends up to group_size paragraphs per request so the shared
+        instructions are paid for once per group.
+        
+        Args:
+            protocol_paragraphs: Texts from protocol to check
+            country: Country to check against (e.g., "USA")
+            top_k: Number of regulations to check against per paragraph
+            group_size: Maximum paragraphs per LLM call (default: 4)
+            
+        Returns:
+            Compliance analysis per paragraph, in input order
+        """
+        # Step 1: Find relevant regulations for every paragraph (bounded so
+        # one large PDF does not swamp Chroma)
+        sem = asyncio.Semaphore(settings.MAX_CONCURRENT_CHUNKS)
+        
+        async def retrieve(paragraph: str) -> List[Dict]:
+            async with sem:
+                return await asyncio.to_thread(self.retrieve_with_hipporag, paragraph, country, top_k)
+        
+        # A failed retrieval only marks its own paragraph as an error
+        retrieved = await asyncio.gather(
+            *(retrieve(paragraph) for paragraph in protocol_paragraphs),
+            return_exceptions=True
+        )
+        
+        results: List[Optional[Dict]] = [None] * len(protocol_paragraphs)
+        items = []
+        indices = []
+        for index, (paragraph, relevant_regs) in enumerate(zip(protocol_paragraphs, retrieved)):
+            if isinstance(relevant_regs, Exception):
+                print(f"Error retrieving regulations for chunk {index}: {relevant_regs}")
+                results[index] = {
+                    "error": f"Retrieval failed: {relevant_regs}",
+                    "status": "ERROR",
+                    "protocol_text": paragraph
+                }
+            elif not relevant_regs:
+                results[index] = {
+                    "error": "No relevant regulations found",
+                    "status": "ERROR",
+                    "protocol_text": paragraph
+                }
+            else:
+                items.append((paragraph, relevant_regs))
+                indices.append(index)
+        
+        # Step 2: Check compliance, several paragraphs per agent call
+        checked = await self.compliance_agent.check_compliance_grouped(
+            items,
+            group_size=group_size,
+            concurrency=settings.MAX_CONCURRENT_CHUNKS
+        )
+        for index, compliance_result in zip(indices, checked):
+            results[index] = compliance_result
+        
+        return results
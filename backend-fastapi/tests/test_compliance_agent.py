@@ -0,0 +1,109 @@
+"""Tests for the compliance agent's prompt building and response parsing"""
+
+import pytest
+
+from app.agents.compliance_agent import (
+    _USER_PROMPT_HEAD,
+    _USER_PROMPT_MID,
+    _JsonArrayStream,
+    _build_user_prompt,
+    _decode_first_array,
+    _format_clause,
+)
+
+REGULATIONS = [
+    {"clause_id": "21-CFR-50.25", "severity": "critical", "section": "Informed consent", "text": "Describe risks."},
+    {"clause_id": "21-CFR-56.108", "severity": "high", "section": "IRB", "text": "Report changes."},
+]
+
+
+def test_format_clause_matches_inline_format():
+    assert _format_clause("c1", "high", "Topic A", "Do X.") == (
+        "[c1] (Severity: high)\n"
+        "Topic: Topic A\n"
+        "Requirement: Do X."
+    )
+
+
+def test_build_user_prompt_lists_regulations_then_paragraph():
+    prompt = _build_user_prompt("Participants are informed.", REGULATIONS)
+
+    regulations_text = "\n\n".join(
+        _format_clause(reg["clause_id"], reg["severity"], reg["section"], reg["text"])
+        for reg in REGULATIONS
+    )
+    assert prompt == _USER_PROMPT_HEAD + regulations_text + _USER_PROMPT_MID + "Participants are informed."
+
+
+def test_build_user_prompt_keeps_braces_literal():
+    # Clause text is concatenated, never passed through str.format
+    prompt = _build_user_prompt("{protocol}", [{**REGULATIONS[0], "text": "Use {placeholders} as-is."}])
+
+    assert "Use {placeholders} as-is." in prompt
+    assert prompt.endswith("{protocol}")
+
+
+def _feed_all(stream, pieces):
+    items = []
+    for piece in pieces:
+        items.extend(stream.feed(piece))
+    return items + stream.finish()
+
+
+def test_json_array_stream_yields_elements_as_they_complete():
+    stream = _JsonArrayStream()
+
+    assert stream.feed('Here you go: [{"a": 1}, {"b"') == [{"a": 1}]
+    assert stream.feed(': [2, 3]}') == [{"b": [2, 3]}]
+    assert stream.feed(']') == []
+    assert stream.closed
+    assert stream.finish() == []
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_json_array_stream_is_independent_of_chunking(size):
+    text = 'Result:\n[{"t": "a ] b", "n": null}, {"q": "say \\"[x]\\""}, 1, "s", [4, [5]]] trailing [9]'
+    pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+    assert _feed_all(_JsonArrayStream(), pieces) == [
+        {"t": "a ] b", "n": None},
+        {"q": 'say "[x]"'},
+        1,
+        "s",
+        [4, [5]],
+    ]
+
+
+def test_json_array_stream_empty_array():
+    assert _feed_all(_JsonArrayStream(), ["[", " ]"]) == []
+
+
+def test_json_array_stream_truncated_after_items_raises():
+    stream = _JsonArrayStream()
+    stream.feed('[{"a": 1}, {"b": 2')
+
+    with pytest.raises(ValueError):
+        stream.finish()
+
+
+def test_json_array_stream_without_array_raises():
+    stream = _JsonArrayStream()
+    stream.feed("No violations found.")
+
+    with pytest.raises(ValueError):
+        stream.finish()
+
+
+def test_decode_first_array_ignores_surrounding_prose():
+    text = 'Analysis below.\n```json\n[{"regulation_id": "r1", "is_related": true}]\n```\nSee also [1].'
+
+    assert _decode_first_array(text) == [{"regulation_id": "r1", "is_related": True}]
+
+
+def test_decode_first_array_skips_brackets_that_are_not_arrays():
+    assert _decode_first_array('Per [21 CFR 50] the result is [1, 2]') == [1, 2]
+
+
+def test_decode_first_array_without_array_raises():
+    with pytest.raises(ValueError):
+        _decode_first_array('{"not": "an array"}')
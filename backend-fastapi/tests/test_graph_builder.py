@@ -0,0 +1,154 @@
+"""Tests for the regulation graph's Personalized PageRank and embedding neighbors"""
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import app.graph.graph_builder as graph_builder
+from app.graph.graph_builder import RegulationGraphBuilder, _l2_normalize, _nearest_neighbors
+
+
+def _random_graph(num_nodes=300, num_edges=900, seed=0):
+    """LLM edges (confidence 1.0) and semantic edges (0.1), plus an isolated node"""
+    rng = np.random.default_rng(seed)
+    builder = RegulationGraphBuilder()
+    edges = []
+    for i in range(num_edges):
+        relation, confidence = ("REFERENCES", 1.0) if i % 3 else ("SIMILAR_TO", 0.1)
+        src, dst = rng.integers(num_nodes, size=2)
+        edges.append((f"n{src}", f"n{dst}", relation, confidence, None))
+    builder._add_edges(edges)
+    builder.graph.add_node("isolated")
+    return builder
+
+
+def _networkx_ppr(graph, seeds):
+    personalization = {node: 0.0 for node in graph}
+    for seed in seeds:
+        personalization[seed] = 1.0 / len(seeds)
+    return nx.pagerank(
+        graph,
+        alpha=0.85,
+        personalization=personalization,
+        max_iter=100,
+        tol=1e-6,
+        weight="confidence",
+    )
+
+
+@pytest.mark.parametrize("seeds", [["n1"], ["n1", "n2", "n5"]])
+def test_matches_networkx_pagerank(seeds):
+    builder = _random_graph()
+
+    scores = builder.personalized_pagerank(seeds)
+    expected = _networkx_ppr(builder.graph, seeds)
+
+    assert scores.keys() == expected.keys()
+    assert max(abs(scores[node] - expected[node]) for node in expected) < 1e-6
+
+
+def test_duplicate_and_missing_seeds_are_ignored():
+    builder = _random_graph()
+
+    scores = builder.personalized_pagerank(["n1", "n2", "n1", "missing"])
+    expected = _networkx_ppr(builder.graph, ["n1", "n2"])
+
+    assert max(abs(scores[node] - expected[node]) for node in expected) < 1e-6
+
+
+def test_graph_without_edges_returns_personalization():
+    builder = RegulationGraphBuilder()
+    builder.graph.add_nodes_from(["a", "b", "c"])
+
+    assert builder.personalized_pagerank(["a", "b", "a"]) == {"a": 0.5, "b": 0.5, "c": 0.0}
+
+
+def test_single_node_graph():
+    builder = RegulationGraphBuilder()
+    builder._add_edges([("a", "a", "REFERENCES", 1.0, None)])
+
+    assert builder.personalized_pagerank(["a"]) == {"a": 1.0}
+
+
+def test_no_valid_seeds_gives_uniform_scores():
+    builder = _random_graph(num_nodes=10, num_edges=20)
+    n = builder.graph.number_of_nodes()
+
+    assert builder.personalized_pagerank(["missing"]) == {node: 1.0 / n for node in builder.graph}
+
+
+def _embeddings(num_rows=60, dim=24, seed=0):
+    rng = np.random.default_rng(seed)
+    return _l2_normalize(rng.standard_normal((num_rows, dim)))
+
+
+def _exact_neighbors(normalized, k):
+    """Brute-force reference: full similarity matrix, sorted best first"""
+    similarity = normalized.astype(np.float64) @ normalized.T.astype(np.float64)
+    k = min(k + 1, normalized.shape[0])
+    indices = np.argsort(-similarity, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(similarity, indices, axis=1), indices
+
+
+def _assert_matches_exact(normalized, k, similarities, indices, atol=1e-5):
+    expected_similarities, expected_indices = _exact_neighbors(normalized, k)
+    assert similarities.shape == indices.shape == expected_indices.shape
+    # Each row's best match is itself
+    assert (indices[:, 0] == np.arange(normalized.shape[0])).all()
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(similarities, expected_similarities, atol=atol)
+
+
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_nearest_neighbors_faiss(monkeypatch, k):
+    faiss = pytest.importorskip("faiss")
+    monkeypatch.setattr(graph_builder, "faiss", faiss)
+    monkeypatch.setattr(graph_builder, "cp", None)
+    normalized = _embeddings()
+
+    similarities, indices = _nearest_neighbors(normalized, k)
+
+    _assert_matches_exact(normalized, k, similarities, indices)
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def top_k_rows(request, monkeypatch):
+    """Run the dense paths with the Numba top-k kernel and with argpartition"""
+    if request.param == "numba" and graph_builder._top_k_rows is None:
+        pytest.skip("numba not installed")
+    if request.param == "numpy":
+        monkeypatch.setattr(graph_builder, "_top_k_rows", None)
+    # Several blocks, the last one partial
+    monkeypatch.setattr(graph_builder, "SIMILARITY_BLOCK_ROWS", 16)
+    monkeypatch.setattr(graph_builder, "faiss", None)
+    monkeypatch.setattr(graph_builder, "cp", None)
+
+
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_nearest_neighbors_numpy(monkeypatch, top_k_rows, k):
+    monkeypatch.setattr(graph_builder, "simsimd", None)
+    normalized = _embeddings()
+
+    similarities, indices = _nearest_neighbors(normalized, k)
+
+    _assert_matches_exact(normalized, k, similarities, indices)
+
+
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_nearest_neighbors_simsimd(monkeypatch, top_k_rows, k):
+    simsimd = pytest.importorskip("simsimd")
+    monkeypatch.setattr(graph_builder, "simsimd", simsimd)
+    normalized = _embeddings()
+
+    similarities, indices = _nearest_neighbors(normalized, k)
+
+    # Ranking runs on int8 codes, so near-ties may swap; scores are the
+    # float32 dot products of whichever neighbors were picked
+    expected_similarities, expected_indices = _exact_neighbors(normalized, k)
+    assert similarities.shape == indices.shape == expected_indices.shape
+    assert (indices[:, 0] == np.arange(normalized.shape[0])).all()
+    np.testing.assert_allclose(
+        similarities, np.einsum("nd,nkd->nk", normalized, normalized[indices]), atol=1e-5
+    )
+    assert (np.diff(similarities, axis=1) <= 1e-6).all()
+    np.testing.assert_allclose(similarities, expected_similarities, atol=0.05)
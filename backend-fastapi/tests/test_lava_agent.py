@@ -0,0 +1,86 @@
+"""Tests for LavaAgent's rate-limit handling and SSE framing"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from app.agents.lava_agent import _iter_sse_data, _retry_delay, _seconds_until
+
+
+def test_seconds_until_rfc3339():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert _seconds_until(when.isoformat()) == pytest.approx(30, abs=2)
+
+
+def test_seconds_until_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=90)
+
+    assert _seconds_until(format_datetime(when, usegmt=True)) == pytest.approx(90, abs=2)
+
+
+def test_seconds_until_past_is_zero():
+    assert _seconds_until("2000-01-01T00:00:00Z") == 0.0
+
+
+def test_seconds_until_unparseable():
+    assert _seconds_until("soon") is None
+
+
+def test_retry_delay_honors_retry_after_seconds():
+    delay = _retry_delay({"retry-after": "10"}, attempt=0, base_delay=2.0)
+
+    assert 10 <= delay <= 12.5
+
+
+def test_retry_delay_uses_latest_reset_header():
+    reset = (datetime.now(timezone.utc) + timedelta(seconds=20)).isoformat()
+    headers = {"retry-after": "5", "anthropic-ratelimit-tokens-reset": reset}
+
+    assert 18 <= _retry_delay(headers, attempt=0, base_delay=2.0) <= 25
+
+
+@pytest.mark.parametrize("attempt, backoff", [(0, 2.0), (1, 4.0), (3, 16.0)])
+def test_retry_delay_falls_back_to_exponential_backoff(attempt, backoff):
+    delay = _retry_delay({"retry-after": "garbage"}, attempt=attempt, base_delay=2.0)
+
+    assert backoff <= delay <= backoff * 1.25
+
+
+def _sse_events(chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [data async for data in _iter_sse_data(source())]
+
+    return asyncio.run(collect())
+
+
+STREAM = (
+    b"event: message_start\r\ndata: {\"type\": \"message_start\"}\r\n\r\n"
+    b": keep-alive comment\n\n"
+    b"event: content_block_delta\ndata: {\"a\":\ndata:1}\n\n"
+    b"data:no-space\n\n"
+    b"data: {\"type\": \"message_stop\"}"
+)
+EXPECTED = [
+    b'{"type": "message_start"}',
+    b'{"a":\n1}',
+    b"no-space",
+    b'{"type": "message_stop"}',
+]
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, len(STREAM)])
+def test_iter_sse_data_is_independent_of_chunking(size):
+    chunks = [STREAM[i:i + size] for i in range(0, len(STREAM), size)]
+
+    assert _sse_events(chunks) == EXPECTED
+
+
+def test_iter_sse_data_empty_stream():
+    assert _sse_events([]) == []
@@ -0,0 +1,62 @@
+"""Tests for page-aligned PDF chunking in the regulation routes"""
+
+from app.api.routes.regulations import _chunk_offsets
+
+
+def _join_pages(pages):
+    """Text and page ends as built by _get_pdf_text (each page plus a newline)"""
+    page_ends = []
+    end = 0
+    for page in pages:
+        end += len(page) + 1
+        page_ends.append(end)
+    return "".join(page + "\n" for page in pages), page_ends
+
+
+def _assert_contiguous(text, offsets):
+    assert offsets[0][0] == 0
+    assert offsets[-1][1] == len(text)
+    for (_, end), (start, _) in zip(offsets, offsets[1:]):
+        assert end == start
+
+
+def test_chunks_end_on_page_boundaries():
+    text, page_ends = _join_pages([f"page {i} " * 20 for i in range(10)])
+
+    offsets = _chunk_offsets(text, page_ends, 5)
+
+    assert len(offsets) == 5
+    _assert_contiguous(text, offsets)
+    assert all(end in page_ends for _, end in offsets)
+
+
+def test_never_more_chunks_than_requested():
+    text, page_ends = _join_pages(["short"] * 3)
+
+    offsets = _chunk_offsets(text, page_ends, 12)
+
+    assert len(offsets) == 3
+    _assert_contiguous(text, offsets)
+
+
+def test_long_page_is_split_at_line_breaks():
+    text, page_ends = _join_pages(["\n".join(f"line {i}" for i in range(200))])
+
+    offsets = _chunk_offsets(text, page_ends, 4)
+
+    assert len(offsets) == 4
+    _assert_contiguous(text, offsets)
+    assert all(text[end - 1] == "\n" for _, end in offsets)
+
+
+def test_blank_pages_do_not_become_chunks():
+    text, page_ends = _join_pages(["a" * 100, "   ", "b" * 100, "", "c" * 100])
+
+    offsets = _chunk_offsets(text, page_ends, 5)
+
+    assert [text[start:end].strip()[0] for start, end in offsets] == ["a", "b", "c"]
+
+
+def test_empty_text():
+    assert _chunk_offsets("", [], 12) == []
+    assert _chunk_offsets("  \n", [3], 12) == []
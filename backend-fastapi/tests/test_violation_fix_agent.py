@@ -0,0 +1,21 @@
+"""Tests for the violation fix agent's response parsing"""
+
+import pytest
+
+from app.agents.violation_fix_agent import _find_json_array
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"type": "delete"}]', '[{"type": "delete"}]'),
+    ('Changes:\n[{"a": [1, 2]}]\nThese address [violation 1].', '[{"a": [1, 2]}]'),
+    ('[{"original": "see ] and [ here"}] done', '[{"original": "see ] and [ here"}]'),
+    ('[{"reason": "quote \\" then ]"}]', '[{"reason": "quote \\" then ]"}]'),
+    ('[]', '[]'),
+])
+def test_find_json_array_returns_first_balanced_array(text, expected):
+    assert _find_json_array(text) == expected
+
+
+@pytest.mark.parametrize("text", ['no array here', '[{"unterminated": 1}', ''])
+def test_find_json_array_without_balanced_array(text):
+    assert _find_json_array(text) is None